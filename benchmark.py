@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+import os
+import sys
+import gc
+import time
+import json
+import base64
+import random
+import argparse
+import platform
+import datetime
+import shutil
+import tempfile
+import tracemalloc
+import multiprocessing
+
+import get_projects
+
+'''
+Benchmark for get_projects.py on synthetic data
+
+1. A deterministic data set is generated from a seed: the aliases (groups) file, the LDIF
+   description dump, metis_users.csv, metis_pis.csv and metis_pi_lastlog.csv
+
+2. The description file is written from the LDIF dump, as after the LDAP query, and the stages of
+   MetisProjects.pipeline are run on it through Pipeline.run as main() runs them, timed with --workers
+   threads, and once more one by one under tracemalloc for the peak memory of each stage
+
+3. The stages are run once more in a fresh process for the peak resident set size of a whole run,
+   --max-rss-mb fails the benchmark when it is over budget
+
+4. The timings, peak memory and the sha256 of every generated file are written to a JSON report,
+   a previous report can be passed with --compare to check the outputs did not change
+'''
+
+# Number of groups and users generated for each named scale
+SCALES = {
+    "small": (1000, 10000),
+    "medium": (10000, 100000),
+    "large": (100000, 1000000)
+}
+
+# Departments the synthetic PIs are spread over
+DEPARTMENTS = [
+    "Physics",
+    "Chemistry & Biochemistry",
+    "Computer Science",
+    "Mathematical Sciences",
+    "Biological Sciences",
+    "Geographic & Atmospheric Sciences",
+    "Mechanical Engineering",
+    ""
+]
+
+# Files read and written by the stages, relative to the run directory
+GENERATED_FILES = [get_projects.PROJECT_DESCRIPTION_FILE] + get_projects.OUTPUT_FILES
+
+def generate_data(directory, groups, users, seed=0)->dict:
+    '''
+    Write a synthetic data set to directory and return the paths of its files
+
+    directory: Directory the files are written to
+    groups: Number of project groups
+    users: Number of Metis users, the first of them are the PIs
+    seed: Seed of the random generator, the same seed always generates the same files
+    '''
+    rng = random.Random(seed)
+    paths = {
+        "groups": os.path.join(directory, "metis_project_groups.txt"),
+        "ldif": os.path.join(directory, "metis_project_description.ldif"),
+        "users": os.path.join(directory, "metis_users.csv"),
+        "pis": os.path.join(directory, "metis_pis.csv"),
+        "lastlog": os.path.join(directory, "metis_pi_lastlog.csv")
+    }
+    users = max(users, groups)
+    usernames = [f"u{index:07d}" for index in range(users)]
+    start = datetime.datetime(2020, 1, 1)
+
+    with open(paths["groups"], "w") as groups_file, \
+         open(paths["ldif"], "w") as ldif_file, \
+         open(paths["users"], "w") as users_file, \
+         open(paths["pis"], "w") as pis_file, \
+         open(paths["lastlog"], "w") as lastlog_file:
+
+        # Entries above the projects, skipped by pis_and_projects
+        ldif_file.write("dn: dc=hpc,dc=cls\ndescription: Metis\n\n")
+        ldif_file.write("dn: ou=projects,dc=hpc,dc=cls\ndescription: Metis projects\n\n")
+
+        for index, username in enumerate(usernames):
+            email = f"{username}@niu.edu"
+            department = rng.choice(DEPARTMENTS)
+            users_file.write(f"User {index},{email},{username},{department}\n")
+            groups_file.write(f"{username}: {email}\n")
+
+            # The first groups users are PIs, each with one group
+            if index >= groups:
+                continue
+
+            pi = username
+            pis_file.write(f"User {index},{email},{pi},{rng.choice(DEPARTMENTS)}\n")
+
+            if rng.random() < 0.9:
+                last_login = start + datetime.timedelta(minutes=rng.randrange(60 * 24 * 365 * 4))
+                lastlog_file.write(f"{pi},{email},{last_login:%Y-%m-%d %H:%M:%S}\n")
+            else:
+                lastlog_file.write(f"{pi},{email},Never logged in\n")
+
+            if rng.random() < 0.05:
+                groups_file.write(f"# Disabled PI: {pi}\n")
+                groups_file.write(f"{pi}-members: " + ", ".join(rng.sample(usernames, 3)) + "\n")
+
+            member_count = min(users, 1 + int(rng.expovariate(1 / 8)))
+            groups_file.write(f"grp{index}-pi: {pi}\n")
+            groups_file.write(f"grp{index}-members: " + ", ".join(rng.sample(usernames, member_count)) + "\n")
+
+            # Every 7th project shares the description of the next PI
+            ldif_file.write(f"dn: cn=grp{index},ou=projects,dc=hpc,dc=cls\n")
+            ldif_file.write(f"description: PI={pi}\n")
+            if index % 7 == 0:
+                continue
+
+            description = f"DESCRIPTION=Project {index} studies " + " ".join(
+                rng.choice(("lattice", "proton", "federated", "spatial", "quantum", "climate")) for _ in range(rng.randrange(4, 40))
+            )
+            if rng.random() < 0.1:
+                ldif_file.write(f"description:: {base64.b64encode(description.encode()).decode()}\n\n")
+            else:
+                # Fold long lines at 76 characters, as ldapsearch does
+                line = f"description: {description}"
+                ldif_file.write(line[:76] + "\n")
+                for offset in range(76, len(line), 75):
+                    ldif_file.write(" " + line[offset:offset + 75] + "\n")
+                ldif_file.write("\n")
+
+    return paths
+
+def measured_pipeline(metis_projects, results, trace_memory=False)->get_projects.Pipeline:
+    '''
+    Return the Pipeline of metis_projects, with every stage recording its seconds
+    (or its peak traced memory) on results, keyed by stage name
+    '''
+    def measured(stage):
+        def run(metis_projects):
+            if trace_memory:
+                gc.collect()
+                tracemalloc.reset_peak()
+                stage.run(metis_projects)
+                results[stage.name] = tracemalloc.get_traced_memory()[1]
+            else:
+                start = time.perf_counter()
+                stage.run(metis_projects)
+                results[stage.name] = time.perf_counter() - start
+        return stage._replace(run=run)
+
+    return get_projects.Pipeline([measured(stage) for stage in metis_projects.pipeline().stages.values()])
+
+def run_pipeline(paths, run_directory, trace_memory=False, workers=get_projects.PIPELINE_WORKERS)->dict:
+    '''
+    Write the description file from the LDIF dump and run the pipeline once on a fresh MetisProjects in run_directory
+
+    trace_memory: Record the peak traced memory of every stage instead of its time, running the stages one by one
+    workers: Stages running at the same time
+
+    Returns the seconds (or peak bytes) of every stage, keyed by stage name
+    '''
+    # Start from an empty run directory so every stage writes its files,
+    # with the groups file where the pipeline reads it, as after the groups query
+    for filename in GENERATED_FILES:
+        path = os.path.join(run_directory, filename)
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.copyfile(paths["groups"], os.path.join(run_directory, get_projects.PROJECT_GROUPS_FILE))
+
+    results = {}
+    cwd = os.getcwd()
+    os.chdir(run_directory)
+    try:
+        metis_projects = get_projects.MetisProjects(paths["users"], paths["pis"], paths["lastlog"])
+        if trace_memory:
+            tracemalloc.start()
+            workers = 1
+
+        gc.collect()
+        if trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        metis_projects.write_project_description_file(ldif_filename=paths["ldif"])
+        results["read_descriptions"] = tracemalloc.get_traced_memory()[1] if trace_memory else time.perf_counter() - start
+
+        pipeline = measured_pipeline(metis_projects, results, trace_memory)
+        pipeline.run(metis_projects, workers=workers)
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        os.chdir(cwd)
+
+    # In stage order, whichever stage finished first
+    return {name: results[name] for name in ["read_descriptions"] + list(pipeline.stages)}
+
+def run_pipeline_in_child(paths, run_directory, public_directory, results)->None:
+    '''
+    Run every stage once, in a process started for it, and put its peak resident set size on results
+    '''
+    get_projects.PUBLIC_HTML_DIR = public_directory
+    run_pipeline(paths, run_directory)
+    results.put(max_rss_kb())
+
+def pipeline_max_rss_kb(paths, run_directory):
+    '''
+    Run every stage once in a fresh process and return its peak resident set size in kB,
+    or None where it is not available
+    '''
+    # A spawned process starts from an empty interpreter, so it only holds what one run needs
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(
+        target=run_pipeline_in_child, args=(paths, run_directory, get_projects.PUBLIC_HTML_DIR, results)
+    )
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"The pipeline run for the peak RSS exited with {process.exitcode}")
+
+    return results.get()
+
+def benchmark(groups, users, seed=0, repeat=3, directory=None, workers=get_projects.PIPELINE_WORKERS)->dict:
+    '''
+    Generate a data set, run the pipeline on it and return the report
+
+    groups: Number of project groups
+    users: Number of Metis users
+    seed: Seed of the data generator
+    repeat: Number of timed runs, the fastest time of each stage is reported
+    directory: Directory the data is generated in, a temporary directory by default
+    workers: Stages running at the same time in the timed runs
+    '''
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        directory = directory or temporary_directory
+        run_directory = os.path.join(directory, "run")
+        public_directory = os.path.join(directory, "public")
+        os.makedirs(run_directory, exist_ok=True)
+        os.makedirs(public_directory, exist_ok=True)
+
+        # The html is copied next to the data instead of the real public directory
+        get_projects.PUBLIC_HTML_DIR = public_directory
+
+        start = time.perf_counter()
+        paths = generate_data(directory, groups, users, seed)
+        generate_seconds = time.perf_counter() - start
+
+        timings = []
+        end_to_end = []
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            timings.append(run_pipeline(paths, run_directory, workers=workers))
+            end_to_end.append(time.perf_counter() - start)
+
+        peak_memory = run_pipeline(paths, run_directory, trace_memory=True)
+        pipeline_rss = pipeline_max_rss_kb(paths, run_directory)
+
+        report = {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "groups": groups,
+            "users": users,
+            "seed": seed,
+            "repeat": repeat,
+            "workers": workers,
+            "generate_seconds": generate_seconds,
+            "input_bytes": {name: os.path.getsize(path) for name, path in paths.items()},
+            "stages": {
+                name: {
+                    "seconds": min(timing[name] for timing in timings),
+                    "peak_bytes": peak_memory[name]
+                }
+                for name in timings[0]
+            },
+            "end_to_end_seconds": min(end_to_end),
+            "max_rss_kb": max_rss_kb(),
+            "pipeline_max_rss_kb": pipeline_rss,
+            "outputs": {
+                filename: get_projects.file_fingerprint(os.path.join(run_directory, filename))
+                for filename in GENERATED_FILES
+            }
+        }
+
+    return report
+
+def max_rss_kb():
+    '''
+    Return the peak resident set size of this process in kB, or None where it is not available
+    '''
+    # On Linux ru_maxrss also counts the parent pages a spawned process held before exec
+    try:
+        with open("/proc/self/status", "r") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is in bytes on macOS
+    if sys.platform == "darwin":
+        max_rss //= 1024
+    return max_rss
+
+def compare_reports(previous, current)->bool:
+    '''
+    Print the stage times of current relative to previous
+
+    Returns False if the reports were made from the same data but their outputs differ
+    '''
+    print(f"{'stage':<42}{'previous':>12}{'current':>12}{'ratio':>8}")
+    for name, stage in current["stages"].items():
+        if name not in previous["stages"]:
+            continue
+        before = previous["stages"][name]["seconds"]
+        after = stage["seconds"]
+        ratio = after / before if before else float("inf")
+        print(f"{name:<42}{before:>12.4f}{after:>12.4f}{ratio:>8.2f}")
+
+    before = previous["end_to_end_seconds"]
+    after = current["end_to_end_seconds"]
+    print(f"{'end_to_end':<42}{before:>12.4f}{after:>12.4f}{after / before if before else float('inf'):>8.2f}")
+
+    same_data = all(previous[key] == current[key] for key in ("groups", "users", "seed"))
+    if not same_data:
+        print("The reports were made from different data, outputs not compared")
+        return True
+
+    changed = [
+        filename for filename, fingerprint in current["outputs"].items()
+        if previous["outputs"].get(filename) != fingerprint
+    ]
+    for filename in changed:
+        print(f"Output changed: {filename}")
+    return not changed
+
+def main(argv=None):
+    '''
+    main: Benchmark get_projects.py on synthetic data
+    '''
+    parser = argparse.ArgumentParser(description="Benchmark get_projects.py on synthetic data")
+    parser.add_argument(
+        "--scale", choices=SCALES, default="small",
+        help="Named data set size (default: %(default)s)"
+    )
+    parser.add_argument("--groups", type=int, help="Number of project groups, overrides --scale")
+    parser.add_argument("--users", type=int, help="Number of Metis users, overrides --scale")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the data generator (default: %(default)s)")
+    parser.add_argument(
+        "--repeat", type=int, default=3,
+        help="Timed runs per stage, the fastest is reported (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=get_projects.PIPELINE_WORKERS,
+        help="Pipeline stages running at the same time in the timed runs (default: %(default)s)"
+    )
+    parser.add_argument("--data-dir", help="Generate the data here and keep it, instead of a temporary directory")
+    parser.add_argument(
+        "--output", default="benchmark_report.json",
+        help="File the JSON report is written to (default: %(default)s)"
+    )
+    parser.add_argument("--compare", help="Previous JSON report to compare the timings and outputs against")
+    parser.add_argument(
+        "--max-rss-mb", type=float,
+        help="Fail if the peak resident set size of a whole run is above this many MiB"
+    )
+    args = parser.parse_args(argv)
+
+    groups, users = SCALES[args.scale]
+    groups = args.groups if args.groups is not None else groups
+    users = args.users if args.users is not None else users
+
+    if args.data_dir:
+        args.data_dir = os.path.abspath(args.data_dir)
+        os.makedirs(args.data_dir, exist_ok=True)
+
+    print(f"Benchmarking {groups} groups and {users} users")
+    report = benchmark(groups, users, args.seed, args.repeat, args.data_dir, args.workers)
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    for name, stage in report["stages"].items():
+        print(f"{name:<42}{stage['seconds']:>10.4f} s{stage['peak_bytes'] / 1048576:>10.1f} MiB")
+    print(f"{'end_to_end':<42}{report['end_to_end_seconds']:>10.4f} s")
+
+    pipeline_rss = report["pipeline_max_rss_kb"]
+    if pipeline_rss is not None:
+        print(f"{'peak_rss':<42}{pipeline_rss / 1024:>23.1f} MiB")
+        if args.max_rss_mb is not None and pipeline_rss / 1024 > args.max_rss_mb:
+            print(f"Peak RSS {pipeline_rss / 1024:.1f} MiB is over the {args.max_rss_mb:g} MiB budget")
+            return 1
+
+    if args.compare:
+        with open(args.compare, "r") as file:
+            previous = json.load(file)
+        if not compare_reports(previous, report):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    '''
+    python3 benchmark.py --scale small or ./benchmark.py --groups 5000 --users 50000
+    '''
+    sys.exit(main())
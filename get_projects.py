@@ -2,16 +2,49 @@
 import os
 import sys
 import subprocess
+import shlex
 import re
 import pprint
-import itertools
+import bisect
+import datetime
+import hashlib
+import base64
+import json
+import argparse
+import filecmp
+import tempfile
+import threading
+import signal
+import time
+import contextlib
+import functools
+import cProfile
+import sqlite3
+import csv
+import gzip
+import io
+import shutil
+import urllib.parse
+import multiprocessing
+import pickle
+import mmap
+import zipfile
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from collections import namedtuple
+
+# brotli is optional, without it no .br files are published
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 '''
 Flow of program
 
 1. A file is created for project descriptions on Metis, and Metis project groups(pis, and members)
 
-2. Metis projects are stored in the list `active_metis_projects` which contains dictionarys that includes the following
+2. Metis projects are stored in the ProjectRegistry `active_metis_projects` (keyed by group title and PI) as ProjectRecords, written out as dictionarys that include the following
    -"group_title"       : Group title found in the file "metis_project_groups.txt"
    -"PI                 : PIs unique identifier
    -"group_member_count": Quantity of group members 
@@ -28,610 +61,3399 @@ Flow of program
 
 '''
 
-class MetisProjects:
-    
+# Accounting exports cross referenced for the PIs name, department and last login
+METIS_ACCOUNTING_DIR = "/opt/metis/el8/contrib/accounting/metis_active_users_and_pis"
+METIS_USERS_CSV = METIS_ACCOUNTING_DIR + "/metis_users.csv"
+METIS_PIS_CSV = METIS_ACCOUNTING_DIR + "/metis_pis.csv"
+METIS_PI_LASTLOG_CSV = METIS_ACCOUNTING_DIR + "/metis_pi_lastlog.csv"
+
+# Aliases file the groups query reads
+METIS_GROUPS_SOURCE = "/home/admin/data/account_reports/aliases.ldap.Feb1_011701"
+
+# Files generated by the queries in main()
+PROJECT_DESCRIPTION_LDIF = "./metis_project_description.ldif"
+PROJECT_DESCRIPTION_FILE = "./metis_project_description.txt"
+PROJECT_GROUPS_FILE = "./metis_project_groups.txt"
+
+# LDAP server queried for the project descriptions, only the description
+# attribute of entries that have one is requested, in pages of LDAP_PAGE_SIZE
+LDAP_URI = "ldap://pldapms.hpc.cls"
+LDAP_DESCRIPTION_FILTER = "(description=*)"
+LDAP_PAGE_SIZE = 1000
+
+# Seconds a source query may run before it is killed
+QUERY_TIMEOUT = 600
+
+# Threads running independent pipeline stages at the same time
+PIPELINE_WORKERS = 4
+
+# Input fingerprints and options persisted between incremental runs
+STATE_FILE = "./metis_projects_state.json"
+
+# Pipeline stage using each option that changes the outputs, rerun by an incremental run when it changes
+OPTION_STAGES = {
+    "html_shard": "html",
+    "html_page_size": "html",
+    "catalog": "catalog"
+}
+
+# Version of the --snapshot archive layout, and the member describing its content
+SNAPSHOT_VERSION = 1
+SNAPSHOT_MANIFEST = "manifest.json"
+
+# Parsed accounting CSVs, reused while the exports do not change,
+# entries not used for ACCOUNTING_CACHE_MAX_AGE days are removed
+ACCOUNTING_CACHE_DIR = "./metis_accounting_cache"
+ACCOUNTING_CACHE_MAX_AGE = 30
+
+# Files written on every run
+OUTPUT_FILES = [
+    "./disabled_pis.txt",
+    "./active_pis.txt",
+    "./archived_metis_projects.txt",
+    "./web_metis_project_data.txt",
+    "./web_metis_pi_project_descriptions.txt",
+    "./web_project_html.txt",
+    "./web_metis_project_data.jsonl",
+    "./web_metis_project_data.json",
+    "./archived_metis_projects.jsonl",
+    "./archived_metis_projects.json",
+    "./web_metis_pi_project_descriptions.jsonl",
+    "./web_metis_pi_project_descriptions.json",
+    "./excluded_metis_projects.txt",
+    "./excluded_metis_projects.jsonl",
+    "./excluded_metis_projects.json",
+    "./metis_project_memberships.json",
+    "./web_project_search.json"
+]
+
+# Reasons a project is left off the web page, recorded by MetisProjects.validate_projects
+EXCLUDED_MISSING_PI_NAME = "missing_pi_name"
+EXCLUDED_MISSING_DEPARTMENT = "missing_department"
+EXCLUDED_NO_MEMBERS = "no_members"
+EXCLUDED_NO_DESCRIPTION = "no_description"
+EXCLUDED_ARCHIVED = "archived"
+
+# Version of the record layout in the JSON outputs, raised when a field changes meaning or is removed
+JSON_SCHEMA_VERSION = 1
+
+# Public directory projects.php serves the html from
+PUBLIC_HTML_DIR = "/var/www/html/pub/metis_projects"
+
+# Address and input polling interval (seconds) of the --serve JSON API
+SERVE_HOST = "127.0.0.1"
+SERVE_PORT = 8642
+SERVE_POLL_INTERVAL = 60
+
+# Sidecar holding the ETag (sha256 of the content) of every published file
+PUBLISH_ETAG_EXTENSION = ".etag"
+
+def file_fingerprint(filename):
+    '''
+    Return the sha256 of the file contents, or None if the file does not exist
+    '''
+    digest = hashlib.sha256()
+    try:
+        with open(filename, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 16), b""):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+class LDIFReader:
+    '''
+    Incremental reader for LDIF output of ldapsearch, fed one line at a time.
+    Continuation lines are unfolded and base64 ("attribute:: value") values decoded.
+    Entries are returned as dictionaries of attribute -> list of values.
+    '''
+
     def __init__(self):
         '''
-        Constructor for MetisProjects
-        '''
-        
-        # Stores all active PI's and their projects
-        self.active_metis_projects = []    
-        self.disabled_pis = [] 
-        self.active_pis = []
-        self.user_ids_and_emails = []
-        self.missing_pi_department = {
-            "piot" : "Physics",
-            "yyin" : "Chemistry & Biochemistry",
-            "hedin" : "Physics"
-        }
-        self.updated_project_descriptions = {
-            "AML" : "The AML project is for research in machine learning, federated learning and optimization.",
-            "ATLAS" : "The ATLAS group searches for new particles beyond the Standard Model, focusing on final states with multiple heavy quarks.",
-            "AVLAB" : "Analyzing large spatial datasets to understand the factors affecting US Hospitals' success requires considering a very detailed spatial context for each health facility.",
-            "AVLAB2" : "The study of how participants of a federated fine-tuning regime can achieve an equilibrium, where every member is sufficiently incentivized to participate.",
-            "LINLAB" : "LINLAB is a NIU research team that works on the quadruped robots as guide dogs for the visually impaired population.",
-            "PCT" : "The pcT (proton computed Tomography) project focuses on reconstructing 3D tomographic medical images using protons. These high-resolution images are used to support post-diagnosis, proton-based cancer treatment by improving the accuracy of proton dose delivery. Innovations from the pcT project have led to four U.S. patents and five international patents.",
-            "PRAD" : "The PRAD (Proton Radiography) project is dedicated to reconstructing 2D radiographic medical images using protons. These images play a vital role in post-diagnosis, proton-based cancer treatment by enhancing treatment planning and verification. Innovations from the PRAD project have contributed to four U.S. patents and five international patents.",
-            "REDCAP" : "REDCap is a secure web platform for building and managing online databases and surveys. It is available to NIU faculty, staff, and students for use in research projects.",
-            "ZWLAB" : "Developing iGAIT a smartphone-based tool that uses machine learning and video gait analysis to help detect early signs of autism in children."
-        }
-        self.archived_metis_projects = [
-            "chem600s2017",
-            "aard",
-            "cmodel",
-            "fast",
-            "hedin",
-            "jahreda",
-            "npohlman",
-            "piot",
-            "ritelab",
-            "syphers",
-            "resx",
-            "bios641"
-        ]
-        self.pi_and_project_descriptions = {}
-        self.black_list_projects = []
-        
-    def query_and_write_file(self, command, filename)-> str:
+        Constructor for LDIFReader
         '''
-        Run a comand and write the results to a file
+        self.entry = {}
+        self.logical_line = None
 
-        command: Command to be executed
-        filename: File to be written to
+    def feed(self, line)->list:
         '''
-        # Execute the command on machine
-        query_projects_output = subprocess.run(
-            command, shell=True, stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE, universal_newlines=True
-        )
-        std_out = query_projects_output.stdout
+        Read one line, and return the entries it completed
+        '''
+        line = line.rstrip("\r\n")
 
-        with open(filename, "w") as filename_description:
-            filename_description.write(std_out)
+        # A line starting with a single space continues the previous line
+        if line.startswith(" ") and self.logical_line is not None:
+            self.logical_line += line[1:]
+            return []
 
-        return std_out
+        self.add_logical_line()
 
-    def write_disabled_pis(self, filename="./metis_project_groups.txt")->None:
+        # A blank line ends the entry
+        if not line:
+            return self.close()
+
+        self.logical_line = line
+        return []
+
+    def close(self)->list:
         '''
-        Write all disabled pis to disabled_pis.txt
-        
-        filename: The file to read the data from
+        Finish the current entry, and return it if it has any attributes
         '''
-        with open(filename, "r") as file:
-            for line in file:
+        self.add_logical_line()
 
-                # Skip empty lines
-                if not line:
-                    continue
-                
-                pattern_disabled_pi = r"(^#\s*Disabled\s+PI:\s+(\w+)$)"
-                match_disabled_pi = re.findall(pattern_disabled_pi, line)
-                for match in match_disabled_pi:
-                    self.disabled_pis.append(match[1])
+        entry, self.entry = self.entry, {}
+        return [entry] if entry else []
 
-        with open("./disabled_pis.txt", "w") as file:
-            for element in self.disabled_pis:
-                file.write(element + "\n")
+    def add_logical_line(self)->None:
+        '''
+        Add the unfolded line read so far to the current entry
+        '''
+        line, self.logical_line = self.logical_line, None
 
-    def write_archived_metis_projects(self, filename="./metis_project_groups.txt") -> None:
-        ''''
-        Store and write all archived metis projects
+        # Skip comments and anything that is not "attribute: value"
+        if line is None or line.startswith("#"):
+            return
+        attribute, separator, value = line.partition(":")
+        if not separator:
+            return
+
+        if value.startswith(":"):
+            value = base64.b64decode(value[1:].strip()).decode("utf-8", "replace")
+        else:
+            value = value.lstrip(" ")
+
+        self.entry.setdefault(attribute, []).append(value)
+
+def iter_ldif_records(lines):
+    '''
+    Yield the entries of LDIF lines as dictionaries of attribute -> list of values
+    '''
+    reader = LDIFReader()
+    for line in lines:
+        yield from reader.feed(line)
+    yield from reader.close()
+
+# Events emitted by MetisProjects.parse_project_groups for each line of metis_project_groups.txt
+#   -DisabledPI : "# Disabled PI: <pi>" comment lines
+#   -GroupEntry : "<group>-pi: <pi>" and "<group>-members: <members>" lines, kind is "pi" or "members"
+#   -UserEmail  : "<ID>: <email>" pairs
+DisabledPI = namedtuple("DisabledPI", ["pi"])
+GroupEntry = namedtuple("GroupEntry", ["key", "kind", "value"])
+UserEmail = namedtuple("UserEmail", ["ID", "email"])
+
+# A cluster processed by --batch, in its own working directory, every other field defaults to Metis
+ClusterConfig = namedtuple(
+    "ClusterConfig",
+    ["name", "directory", "ldap_uri", "groups_source", "metis_users_csv", "metis_pis_csv", "metis_pi_lastlog_csv", "public_html_dir"],
+    defaults=[".", LDAP_URI, METIS_GROUPS_SOURCE, METIS_USERS_CSV, METIS_PIS_CSV, METIS_PI_LASTLOG_CSV, PUBLIC_HTML_DIR]
+)
+
+# A stage of the MetisProjects pipeline, run(metis_projects) reads the resources
+# named in inputs and writes those named in outputs (state on MetisProjects or output files)
+PipelineStage = namedtuple("PipelineStage", ["name", "inputs", "outputs", "run"])
+
+# (^#\s*Disabled\s+PI:\s+(\w+)$) : A "# Disabled PI: name" comment line
+DISABLED_PI_PATTERN = re.compile(r"^#\s*Disabled\s+PI:\s+(\w+)$")
+
+# ([a-zA-Z0-9\-]+):\s+(email) : Tuples of IDs and emails
+USER_EMAIL_PATTERN = re.compile(r"([a-zA-Z0-9\-]+):\s+([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})")
+
+# (\w+-(pi|members)) : Captures a key-like string (e.g., "user-pi" or "admin-members").
+# :                  : Matches a literal colon.
+# \s+                : Matches one or more whitespace characters.
+# (.*)               : Captures everything else in the line as a value.
+GROUP_ENTRY_PATTERN = re.compile(r"(\w+-(pi|members)):\s+(.*)")
+
+# Lines of metis_project_description.txt naming a PI, and the project description that follows it
+DESCRIPTION_PI_PREFIX = "description: PI="
+DESCRIPTION_TEXT_PREFIX = "description: DESCRIPTION="
+
+class AccountingCache:
+    '''
+    Parsed tables of the accounting CSVs, stored on disk per export as a small .index JSON file
+    with the path, size, mtime and sha256 of the export, and a .pickle file with the table as columns.
+    An export whose size and mtime match is not read again, one whose mtime changed is
+    only hashed, and it is parsed again when its content changed.
+    Entries whose export is gone, or that were not used for max_age days, are removed
+    by reading their index files only.
+    The tables are unpickled, so the directory must only be writable by the account running the job.
+    '''
+
+    # Version of the entry layout, entries of another version are parsed again
+    VERSION = 1
+
+    # "<kind>-<key>.<extension>" files of the entries
+    ENTRY_PATTERN = re.compile(r"^(users|pis|lastlog)-([0-9a-f]{32})\.(index|pickle)$")
+
+    # Columns read from each kind of export, the rows with fewer columns are skipped
+    #   users   : name, email, department -> {email: (name, department)}, later rows win
+    #   pis     : name, department        -> {name: department}, first non-empty department wins
+    #   lastlog : email, last login       -> {normalized email: last login}, first row wins
+    COLUMNS = {
+        "users": (0, 1, 3),
+        "pis": (0, 3),
+        "lastlog": (1, 2)
+    }
+
+    def __init__(self, directory=ACCOUNTING_CACHE_DIR, max_age=ACCOUNTING_CACHE_MAX_AGE):
         '''
-        with open(filename, "r") as file:
-            for line in file:
-                
-                # Temp dict to store archived project data
-                metis_projects = {
-                    "group_title": None,
-                    "PI" : None, 
-                    "group_member_count": None 
-                }
-
-                for pi in self.disabled_pis:
-                    if line.startswith(pi):             
-                        line = line.replace(pi + "-members:", "")
-                        line = line.replace(" ", "")
-                        members = line.strip().split(",")
-
-                        metis_projects = {
-                            "group_title": pi,
-                            "PI" : pi, 
-                            "group_member_count": len(members)  
-                        }
-
-                        self.archived_metis_projects.append(metis_projects)
-
-        with open("archived_metis_projects.txt", "w") as file:
-            for value in self.archived_metis_projects:
-                formatted_value = pprint.pformat(value)  
-                file.write(formatted_value + "\n") 
-                file.write("" + "\n")  
-        
-    def write_active_pis(self, filename="./metis_project_groups.txt")->None:
+        Constructor for AccountingCache
+
+        directory: Directory the entries are kept in, created on first write, None to only keep them in memory
+        max_age: Days an entry is kept without being used
         '''
-        Write all active pis to active_pis.txt
-        
-        filename: The file
+        # Absolute, so the --batch workers share it after changing to their cluster directory
+        self.directory = None if directory is None else os.path.abspath(directory)
+        self.max_age = max_age
+
+        # (path, kind) -> (size, mtime, table) of the entries used by this process
+        self.tables = {}
+
+        self.evict()
+
+    @classmethod
+    def parse(cls, filename, kind)->tuple:
         '''
-        extracted_data = {}
-        
-        with open(filename, "r") as file:
-            for line in file:
+        Parse an accounting export with the csv module, keeping only the columns of kind
 
-                # Skip empty lines
-                if not line:
-                    continue
-                       
-                # Evaluate each line in the file
-                # (\w+-(pi|members)) : Captures a key-like string (e.g., "user-pi" or "admin-members").
-                # :                  : Matches a literal colon.
-                # \s+                : Matches one or more whitespace characters.
-                # (.*)               : Captures everything else in the line as a value.
-                match = re.match(r"(\w+-(pi|members)):\s+(.*)", line)
-                if match:
-                    key, _, value = match.groups() # Return a tuple of matched groups
-                    extracted_data[key] = value.strip()
-
-            # Iterate through the matched lines 
-            for key, value in extracted_data.items():
-
-                # Evaluate PI lines
-                if key.endswith("-pi"):
-                    self.active_pis.append(value)
-                    
-            with open("./active_pis.txt", "w") as file:
-                for element in self.active_pis:
-                    file.write(element + "\n")
-            
-    def extract_project_pi_and_members(self, filename="./metis_project_groups.txt")->dict:
-        ''''
-        This function leverages a regex expression to read the file
-        to captures the PI and group members for a project on Metis
-        
-        filename: The file to read from
+        Returns the table and the number of rows read
         '''
-        extracted_data = {}
-        
-        with open(filename, "r") as file:
-            for line in file:
+        columns = cls.COLUMNS[kind]
+        width = max(columns) + 1
+        table = {}
+        rows = 0
 
-                # Skip empty lines
-                if not line:
+        with open(filename, "r", newline="") as file:
+            for row in csv.reader(file):
+                rows += 1
+                if len(row) < width:
                     continue
-    
-                # Regex to gather tuples of IDs and emails
-                pattern = r"([a-zA-Z0-9\-]+):\s+([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})"
-
-                # If the line matches the regex append line to matches
-                matches = re.findall(pattern, line)
-                for match in matches:
-                    # Temporary dictionary to store the current lines ID, and email matched
-                    user_data = {
-                        "ID" : match[0],
-                        "email" : match[1]
-                    }
-                    # Insert the current iterations data into the list 
-                    self.user_ids_and_emails.append(user_data)
-                        
-                # Evaluate each line in the file
-                # (\w+-(pi|members)) : Captures a key-like string (e.g., "user-pi" or "admin-members").
-                # :                  : Matches a literal colon.
-                # \s+                : Matches one or more whitespace characters.
-                # (.*)               : Captures everything else in the line as a value.
-                match = re.match(r"(\w+-(pi|members)):\s+(.*)", line)
-                if match:
-                    key, _, value = match.groups() # Return a tuple of matched groups
-                    extracted_data[key] = value.strip()
-
-        return extracted_data
-     
-    def assign_project_data(self, extracted_project_data)->None:
-        ''''
-        Handles the extracted PI and team members 
-        and appends the project data to active_metis_projects
-        
-        extracted_project_data: The extracted project data read from the file
+                values = [row[column] for column in columns]
+
+                if kind == "users":
+                    table[values[1]] = (values[0], values[2])
+                elif kind == "pis":
+                    if table.get(values[0], "") == "":
+                        table[values[0]] = values[1]
+                else:
+                    table.setdefault(LastLoginIndex.normalize_email(values[0]), values[1].strip())
+
+        return table, rows
+
+    @staticmethod
+    def file_sha256(filename)->str:
         '''
-        
-        # Iterate through the matched lines 
-        # key:   groupname-pi, or groupname-members
-        # value: Either the PI name or names of the group members
-        for key, value in extracted_project_data.items():
-            
-            # Evaluate PI lines
-            if key.endswith("-pi"):
-                project = {
-                    "group_title": key[:-3],
-                    "PI" : value, 
-                    "group_member_count": None,
-                    "PI_name": None,
-                    "PI_department": None,
-                    "PI_email": None,
-                    "description": None,
-                    "group_members": None,
-                    "pi_last_login":  None
-                }
-                self.active_metis_projects.append(project)
-                        
-            if key.endswith("-members"):
-                group_title = key[:-8]
-                group_members = value
-                member_count = len(value.split(","))
-                
-                for project in self.active_metis_projects:
-                    if project["group_title"] == group_title:
-                        project["group_member_count"] = member_count
-                        project["group_members"] = group_members
+        Return the sha256 of the content of filename
+        '''
+        digest = hashlib.sha256()
+        with open(filename, "rb") as file:
+            for block in iter(functools.partial(file.read, 1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
 
-    def assign_pi_name_and_department(self)->None:
+    def entry_filename(self, path, kind, extension="index")->str:
         '''
-        Cross references the PI, with data in metis_users.csv
-        to assign the PIs email and department info in active_metis_projects
+        Return the file the entry for the export at path is kept in, its index or its pickled table
         '''
-        with open("/opt/metis/el8/contrib/accounting/metis_active_users_and_pis/metis_users.csv", "r") as file:
-            for line in file:
-                pid = ""
-                pi_name = ""
-                pi_department = ""
-                
-                # Split by commas, and check the department column
-                values = line.split(",")     
-                
-                # Cross check our ids, anb emails list
-                for user in self.user_ids_and_emails:
-                    
-                    # if the email matches get the name and department
-                    if user["email"] == values[1]:
-                        
-                        pi_name = values[0] 
-                        pid = user["ID"]
-                        pi_name = values[0]
-                        pi_department = values[3] 
-                        
-                        for project in self.active_metis_projects:
-                            if project["PI"] == pid:
-                                
-                                project["PI_email"] = values[1]
-                                project["PI_name"] = pi_name
-                                project["PI_department"] = pi_department
-        
-        with open("/opt/metis/el8/contrib/accounting/metis_active_users_and_pis/metis_pis.csv", "r") as file:
-            for line in file:
-                values = line.split(",")
-                for data in self.active_metis_projects:
-                    if data["PI_department"] == "":
-                        if(data["PI_name"] == values[0]):
-                            data["PI_department"] = values[3]
-    
-    def get_pi_last_log(self, pi_email, filename="/opt/metis/el8/contrib/accounting/metis_active_users_and_pis/metis_pi_lastlog.csv")->str:
+        key = hashlib.sha256(f"{path}\0{kind}".encode()).hexdigest()[:32]
+        return os.path.join(self.directory, f"{kind}-{key}.{extension}")
+
+    @staticmethod
+    def table_columns(table, kind)->list:
         '''
-        Iterate through metis_pi_lastlog.csv, and return the PIs last login date
+        Return a table as flat lists of strings, which unpickle several times faster than the dictionary
         '''
-        with open(filename, "r") as file:
-            for line in file:                
-                line = line.split(",")
-                
-                if str(pi_email).strip() == str(line[1]).strip():
-                    last_login = line[2] 
-                    return last_login.strip()  
-    
-    def assign_pi_last_log(self)->None:
+        if kind == "users":
+            return [list(table), [name for name, _ in table.values()], [department for _, department in table.values()]]
+        return [list(table), list(table.values())]
+
+    @staticmethod
+    def columns_table(columns, kind)->dict:
         '''
-        Add the PIs last log to the PIs group
+        Return the table of the lists made by table_columns
         '''
-        for project in self.active_metis_projects:
-            if project["PI"] in self.active_pis:
-                pi_last_log = self.get_pi_last_log(pi_email=project["PI_email"])
-                project["pi_last_login"] = pi_last_log
-    
-    def assign_project_descriptions(self)->None:
-        ''''
-        Assign the group their project description
+        if kind == "users":
+            emails, names, departments = columns
+            return dict(zip(emails, zip(names, departments)))
+        return dict(zip(*columns))
+
+    def load(self, filename, kind)->tuple:
         '''
-        # This code is problamatic because 
-        # multiple PIs can be on 1 project
-        # A PI can have multiple projects
-        with open("./metis_project_description.txt", "r") as file:
-            content = file.read()
-            
-            pattern = r'description: PI=([^\n]+)(?:\n(?:description: (?!PI=).*?)*?description: DESCRIPTION=([^\n]+))?'
-            matches = re.findall(pattern, content)
-            
-            results = {}
-            for match in matches:
-                pi = match[0].strip()
-                description = match[1].strip() if len(match) > 1 and match[1] else "No description found"
-                results[pi] = description
-            
-            for pi, description in results.items():
-                # print(f"PI: {pi} - Description: {description}")
-                
-                for data in self.active_metis_projects:
-                    if pi == data["PI"]:
-                        data["description"] = description    
-    
-    def consecutive_pi_lines_helper(self, filename="./metis_project_description.txt")->list:
-        ''''
-        Helper function to identify consecutive lines where 
-        multiple PIs are assigned to 1 or more projects
+        Return the parsed table of an accounting export, from the cache when the export did not change
+
+        Returns the table and the number of rows parsed, None when it came from the cache
         '''
-        current_group = []         # Temp list to hold a single group of consecutive PI lines
-        consecutive_pi_lines = []  # List to store groups of consecutive PI lines
-        
-        with open(filename, "r") as file:
-            lines = file.readlines()  
+        path = os.path.abspath(filename)
+        status = os.stat(path)
+        size, mtime = status.st_size, status.st_mtime_ns
+
+        # Already loaded by this process, or by the parent of a --batch worker
+        cached = self.tables.get((path, kind))
+        if cached is not None and cached[:2] == (size, mtime):
+            return cached[2], None
+
+        index = index_filename = table_filename = None
+        if self.directory is not None:
+            index_filename = self.entry_filename(path, kind)
+            table_filename = self.entry_filename(path, kind, "pickle")
+            try:
+                with open(index_filename, "r") as file:
+                    index = json.load(file)
+            except (OSError, ValueError):
+                pass
+
+        if index is not None and (index.get("version"), index.get("path"), index.get("size")) != (self.VERSION, path, size):
+            index = None
+
+        if index is not None and index["mtime"] != mtime:
+            # Touched, e.g. exported again, but the content may be the same
+            if index["sha256"] == self.file_sha256(path):
+                index["mtime"] = mtime
+                self.save(index_filename, json.dumps(index).encode())
+            else:
+                index = None
+
+        table = rows = None
+        if index is not None:
+            try:
+                with open(table_filename, "rb") as file:
+                    table = self.columns_table(pickle.load(file), kind)
+            except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+                pass
+
+        if table is None:
+            sha256 = self.file_sha256(path)
+            table, rows = self.parse(path, kind)
+
+            # The index last, so an index always describes a complete table
+            if self.directory is not None:
+                self.save(table_filename, pickle.dumps(self.table_columns(table, kind), pickle.HIGHEST_PROTOCOL))
+                index = {"version": self.VERSION, "path": path, "kind": kind, "size": size, "mtime": mtime, "sha256": sha256}
+                self.save(index_filename, json.dumps(index).encode())
+        else:
+            # Mark the entry as used, for evict
+            with contextlib.suppress(OSError):
+                os.utime(index_filename)
+
+        self.tables[(path, kind)] = (size, mtime, table)
+        return table, rows
+
+    def save(self, entry_filename, content)->None:
+        '''
+        Atomically write the bytes of an entry file, a cache that cannot be written only costs the next run a parse
+        '''
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile(mode="wb", dir=self.directory, delete=False) as file:
+                file.write(content)
+            os.replace(file.name, entry_filename)
+        except OSError as error:
+            print(f"Could not write the accounting cache {entry_filename}: {error}", file=sys.stderr)
+
+    def evict(self)->None:
+        '''
+        Remove the entries whose export is gone, those not used for max_age days,
+        and tables without an index
+        '''
+        try:
+            names = os.listdir(self.directory) if self.directory is not None else []
+        except FileNotFoundError:
+            return
+
+        cutoff = time.time() - self.max_age * 86400
+        for name in names:
+            match = self.ENTRY_PATTERN.match(name)
+            if match is None:
+                continue
+            kind, key, extension = match.groups()
+            entry_filename = os.path.join(self.directory, name)
+            index_filename = os.path.join(self.directory, f"{kind}-{key}.index")
+            table_filename = os.path.join(self.directory, f"{kind}-{key}.pickle")
 
-            for line in lines:
-                if line.startswith("description: PI="):
-                    current_group.append(line[16:].strip())  # Add to the current group
+            try:
+                if extension == "pickle":
+                    if not os.path.exists(index_filename):
+                        os.remove(entry_filename)
                 else:
-                    if len(current_group) > 1:  # Only store groups with 2+ PI lines
-                        consecutive_pi_lines.append(current_group)
-                    current_group = []  # Reset for the next potential group
+                    if os.path.getmtime(entry_filename) >= cutoff:
+                        with open(entry_filename, "r") as file:
+                            path = json.load(file).get("path")
+                        if path and os.path.exists(path):
+                            continue
+                    os.remove(entry_filename)
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(table_filename)
+            except (OSError, ValueError, AttributeError):
+                # Being replaced
+                continue
 
-            # Check if the last group collected needs to be added
-            if len(current_group) > 1:
-                consecutive_pi_lines.append(current_group)
-        
-        return consecutive_pi_lines
+class LastLoginIndex:
+    '''
+    Last login dates read once from metis_pi_lastlog.csv,
+    keyed by normalized email with a date sorted index for range queries
+    '''
 
-    def pis_and_projects(self, filename="./metis_project_description.txt") -> None:
+    # Date formats tried, in order, when parsing a last login column
+    DATE_FORMATS = (
+        "%Y-%m-%d",
+        "%Y-%m-%d %H:%M:%S",
+        "%Y-%m-%dT%H:%M:%S",
+        "%m/%d/%Y",
+        "%a %b %d %H:%M:%S %Y",
+    )
+
+    def __init__(self, filename, last_logins):
         '''
-        Retrieves the data for PIs and the projects they are working on
+        Constructor for LastLoginIndex
+
+        filename: The lastlog csv file the data was read from
+        last_logins: Dictionary of normalized email -> last login as written in the file
         '''
-        current_pi = None
+        self.filename = filename
+        self.last_logins = last_logins
 
-        with open(filename, "r") as file:
-        
-            # Skip first 2 lines
-            for line in itertools.islice(file, 2, None):
-                
-                # Ignore this
-                if "description: AFFILIATION=Hewlett-Packard" in line:
-                    continue
-                    
-                # Append the PI
-                if line.startswith('description: PI='):
-                    current_pi = line[len('description: PI='):].strip()
-                    
-                    # Ensure PI is in the dictionary
-                    if current_pi not in self.pi_and_project_descriptions:
-                        self.pi_and_project_descriptions[current_pi] = []
-
-                # Append the description for the PI
-                elif line.startswith('description: DESCRIPTION=') and current_pi is not None:
-                    description = line[len('description: DESCRIPTION='):].strip()
-                    
-                    # Only add the description if it's not already in the list
-                    if description not in self.pi_and_project_descriptions[current_pi]:
-                        self.pi_and_project_descriptions[current_pi].append(description)
-                
-                # Handle scenario where a project description appears on a new line
-                elif not line.startswith('description:') and current_pi is not None and line.strip():
-                    if self.pi_and_project_descriptions[current_pi]:
-                        last_description = self.pi_and_project_descriptions[current_pi][-1]
+        # Sorted login dates, parallel to login_emails
+        dated = []
+        for email, last_login in last_logins.items():
+            login_date = self.parse_date(last_login)
+            if login_date is not None:
+                dated.append((login_date, email))
 
-                        # Avoid adding duplicates caused by multi-line descriptions
-                        updated_description = last_description + ' ' + line.strip()
-                        
-                        # Update last description if it hasn't changed, otherwise append
-                        if updated_description not in self.pi_and_project_descriptions[current_pi]:
-                            self.pi_and_project_descriptions[current_pi][-1] = updated_description
+        dated.sort()
+        self.login_dates = [login_date for login_date, _ in dated]
+        self.login_emails = [email for _, email in dated]
 
-    def pis_missing_description_helper(self)->None:
-        ''''
-        Handles PIs that have missing descriptions 
-        and assigns them the correct project descriptions
+    @classmethod
+    def read(cls, filename):
         '''
-        pi_no_description = []
-        consecutive_pi_lines = self.consecutive_pi_lines_helper()
-            
-        for element, description in self.pi_and_project_descriptions.items():
-            
-            # Reset after every iteration
-            temporary_description = ""
-                
-            # If the PI doesn't have a description append it
-            if not description:
-                pi_no_description.append(element)
-        
-        for element in pi_no_description:
-                
-            # Iterate through consecutive PIs
-            for group in consecutive_pi_lines:
-                
-                # Check if PI in consecutive groups
-                if element in group:
-                        
-                    # If the PI has a missing description assign
-                    # them all the projects of their last group member        
-                    self.pi_and_project_descriptions[element].append(self.pi_and_project_descriptions[group[len(group) - 1]])
-                
-    def resolve_pi_department_discrepancy(self)->None:
-        ''''
-        In the data we are working with some PIs
-        department data is not found, this function resolves this problme
+        Read the lastlog csv file and return its LastLoginIndex
         '''
-        for project in self.active_metis_projects:
-            if project["PI"] in self.missing_pi_department:
-                project_pi = project["PI"]
-                project["PI_department"] = self.missing_pi_department[project_pi]
-                
-    def fetch_active_metis_projects(self)->None:
+        return cls(filename, AccountingCache.parse(filename, "lastlog")[0])
+
+    @staticmethod
+    def normalize_email(email)->str:
+        '''
+        Return the key used to look up an email
         '''
-        Read the contents of the file and sort its contents
+        return str(email).strip().lower()
 
-        filename: The file contents to be read
+    @classmethod
+    def parse_date(cls, value):
         '''
+        Return value as a datetime, or None if it is not a date (e.g. "Never logged in")
+        '''
+        for date_format in cls.DATE_FORMATS:
+            try:
+                return datetime.datetime.strptime(value, date_format)
+            except ValueError:
+                continue
+        return None
 
-        # Extract the PI and team member names that correspond to each project
-        extracted_data = self.extract_project_pi_and_members()
-        
-        # Initialize the project data to active_metis_projects
-        self.assign_project_data(extracted_data)
-        
-        # Retrieve and assign the PIs email and department info to a given project
-        self.assign_pi_name_and_department()
-        
-        # Retrieve and assign project descriptions
-        self.assign_project_descriptions()
-        
-        # Get a list of pis and their projects descriptions
-        self.pis_and_projects()
-        
-        # Check for any missing PI descriptions 
-        self.pis_missing_description_helper()
-        
-        # Resolve PI missing department problem
-        self.resolve_pi_department_discrepancy()
-        
-        # Write all archived metis projects
-        self.write_archived_metis_projects()
-        
-        # Get the PIs last login
-        self.assign_pi_last_log()
+    def get(self, email):
+        '''
+        Return the last login for email, or None if the email is not in the file
+        '''
+        return self.last_logins.get(self.normalize_email(email))
 
-    def write_active_metis_projects(self, data, filename)->None:
-        ''''
-        Write the active metis project data to filename
-        ''' 
-        with open(filename, "w") as file:
-            for value in data:
-                formatted_value = pprint.pformat(value)  
-                file.write(formatted_value + "\n") 
-                file.write("" + "\n")  
-           
-    def write_pis_and_project_descriptions(self, data, filename)->None:
-        ''''
-        Write the pis and their project descriptions to filename
+    def seen_between(self, start, end)->list:
         '''
-        with open(filename, "w") as file:
-            for pi, descriptions in data.items():
-                formatted_data = f"{pi}:\n{pprint.pformat(descriptions, indent=4)}\n\n"
-                file.write(formatted_data)
-    
-    def valid_project_count(self)->int:
+        Return the emails whose last login falls within [start, end)
         '''
-        Return the number of projects without 'None' entries
-        
+        low = bisect.bisect_left(self.login_dates, start)
+        high = bisect.bisect_left(self.login_dates, end)
+        return self.login_emails[low:high]
+
+    def not_seen_since(self, days, now=None)->list:
         '''
-        project_count: int = 0
-        
-        for group in self.active_metis_projects:
-            if group['PI_name'] is None or \
-                group['PI_department'] is None or \
-                group['PI_department'] == "" or \
-                group["group_member_count"] is None or \
-                group['description'] == "No description found" or \
-                group["group_title"] in self.archived_metis_projects or \
-                group["group_title"] in self.archived_metis_projects:
-            
-                # If any None entries, it is considered a "black list" project
-                self.black_list_projects.append(group)
+        Return the emails whose last login is older than days, oldest first.
+        Emails without a parseable login date are not included.
+        '''
+        if now is None:
+            now = datetime.datetime.now()
+        cutoff = now - datetime.timedelta(days=days)
+        return self.login_emails[:bisect.bisect_left(self.login_dates, cutoff)]
+
+class ProjectRecord:
+    '''
+    A Metis project, with the PI, department and member names interned.
+    as_dict and as_archived_dict return the dictionaries the writers print.
+    '''
+    __slots__ = (
+        "group_title",
+        "PI",
+        "PI_name",
+        "PI_department",
+        "PI_email",
+        "description",
+        "members",
+        "members_separator",
+        "members_value",
+        "pi_last_login"
+    )
+
+    def __init__(self, group_title, PI):
+        '''
+        Constructor for ProjectRecord
+
+        group_title: Group title found in the file "metis_project_groups.txt"
+        PI: PIs unique identifier
+        '''
+        self.group_title = group_title
+        self.PI = sys.intern(PI)
+        self.PI_name = None
+        self.PI_department = None
+        self.PI_email = None
+        self.description = None
+        self.members = None
+        self.members_separator = ","
+        self.members_value = None
+        self.pi_last_login = None
+
+    def set_members(self, value, members=None)->None:
+        '''
+        Store the members of a "<group>-members" value as a tuple of interned usernames
+
+        members: The value already split by MembershipIndex.split_members
+        '''
+        self.members_separator = ", " if ", " in value else ","
+        self.members = MembershipIndex.split_members(value) if members is None else members
+
+        # Keep the value itself only when its spacing is irregular, e.g. "a, b,c"
+        self.members_value = None if self.members_separator.join(self.members) == value else value
+
+    def set_department(self, department)->None:
+        '''
+        Set the PIs department, interned since many projects share one
+        '''
+        self.PI_department = sys.intern(department)
+
+    @property
+    def group_member_count(self):
+        '''
+        Quantity of group members, or None if the group has no -members entry
+        '''
+        return None if self.members is None else len(self.members)
+
+    @property
+    def group_members(self):
+        '''
+        The members as written in the groups file, or None
+        '''
+        if self.members is None:
+            return None
+        if self.members_value is not None:
+            return self.members_value
+        return self.members_separator.join(self.members)
+
+    def as_dict(self)->dict:
+        '''
+        Return the project in the dictionary shape of web_metis_project_data.txt
+        '''
+        return {
+            "group_title": self.group_title,
+            "PI" : self.PI,
+            "group_member_count": self.group_member_count,
+            "PI_name": self.PI_name,
+            "PI_department": self.PI_department,
+            "PI_email": self.PI_email,
+            "description": self.description,
+            "group_members": self.group_members,
+            "pi_last_login":  self.pi_last_login
+        }
+
+    def as_archived_dict(self)->dict:
+        '''
+        Return the project in the dictionary shape of archived_metis_projects.txt
+        '''
+        return {
+            "group_title": self.group_title,
+            "PI" : self.PI,
+            "group_member_count": self.group_member_count
+        }
+
+class MembershipIndex:
+    '''
+    Members of every group in metis_project_groups.txt, built while the -members lines are parsed.
+    Maps group -> tuple of interned usernames, and username -> groups in the order they were read.
+    '''
+
+    def __init__(self):
+        '''
+        Constructor for MembershipIndex
+        '''
+        self.members_by_group = {}
+        self.groups_by_member = {}
+
+    @staticmethod
+    def split_members(value)->tuple:
+        '''
+        Return the usernames of a "<group>-members" value, interned
+        '''
+        return tuple(sys.intern(member.strip()) for member in value.split(","))
+
+    @classmethod
+    def from_groups(cls, extracted_project_data):
+        '''
+        Build the index from the -pi/-members entries of the groups file
+        '''
+        index = cls()
+        for key, value in extracted_project_data.items():
+            if key.endswith("-members"):
+                index.add(key[:-8], value)
+        return index
+
+    def add(self, group, value)->None:
+        '''
+        Index the members of group, replacing any members read for it before
+        '''
+        for username in self.members_by_group.get(group, ()):
+            self.groups_by_member.get(username, {}).pop(group, None)
+
+        members = self.split_members(value)
+        self.members_by_group[group] = members
+        for username in members:
+            if username:
+                self.groups_by_member.setdefault(username, {})[group] = None
+
+    def members(self, group):
+        '''
+        Return the usernames of group, or None if the group has no -members entry
+        '''
+        return self.members_by_group.get(group)
+
+    def groups_of(self, username)->list:
+        '''
+        Return the groups username is a member of
+        '''
+        return list(self.groups_by_member.get(username, ()))
+
+    def distinct_users(self, groups=None)->int:
+        '''
+        Return the number of distinct users in groups, or in any group
+        '''
+        if groups is None:
+            return sum(1 for groups_of_member in self.groups_by_member.values() if groups_of_member)
+        return len({username for group in groups for username in self.members_by_group.get(group, ()) if username})
+
+    def department_rollup(self, projects)->dict:
+        '''
+        Return the number of projects and distinct members per department, for ProjectRecords
+        '''
+        groups_by_department = {}
+        for project in projects:
+            department = (project.PI_department or "").strip()
+            groups_by_department.setdefault(department, []).append(project.group_title)
+
+        return {
+            department: {"projects": len(groups), "members": self.distinct_users(groups)}
+            for department, groups in sorted(groups_by_department.items())
+        }
+
+class PIProjectGraph:
+    '''
+    PIs and the project descriptions they are linked to, as a bipartite graph.
+    PIs listed on consecutive lines of the description file share the project described
+    after the last of them. Those runs are unioned with union-find, so a PI resolves
+    to the descriptions of every run it is listed in.
+    '''
+
+    def __init__(self):
+        '''
+        Constructor for PIProjectGraph
+        '''
+        # pi -> ordered set of descriptions, the edges of the graph
+        self.descriptions_by_pi = {}
+
+        # Union-find over the PIs of consecutive PI runs
+        self.parent = {}
+        self.size = {}
+
+        # The last PI of every run, whose descriptions the run shares
+        self.run_owners = []
+
+    def add_descriptions(self, pi, descriptions)->None:
+        '''
+        Link pi to each of descriptions
+        '''
+        linked = self.descriptions_by_pi.setdefault(pi, {})
+        for description in descriptions:
+            linked[description] = None
+
+    def find(self, pi):
+        '''
+        Return the PI representing the block of pi
+        '''
+        parent = self.parent
+        if pi not in parent:
+            parent[pi] = pi
+            self.size[pi] = 1
+            return pi
+
+        while parent[pi] != pi:
+            parent[pi] = parent[parent[pi]]
+            pi = parent[pi]
+        return pi
+
+    def union(self, pis)->None:
+        '''
+        Put every PI of a consecutive run in the same block
+        '''
+        if not pis:
+            return
+        self.run_owners.append(pis[-1])
+
+        root = self.find(pis[0])
+        for pi in pis[1:]:
+            other = self.find(pi)
+            if other == root:
+                continue
+            if self.size[other] > self.size[root]:
+                root, other = other, root
+            self.parent[other] = root
+            self.size[root] += self.size[other]
+
+    def resolve(self)->dict:
+        '''
+        Return pi -> list of descriptions, flattened and without duplicates.
+        A PI without descriptions of its own gets the descriptions of the last PI of every run in its block.
+        '''
+        descriptions_by_block = {}
+        for owner in self.run_owners:
+            block = descriptions_by_block.setdefault(self.find(owner), {})
+            block.update(self.descriptions_by_pi.get(owner, {}))
+
+        resolved = {}
+        for pi, descriptions in self.descriptions_by_pi.items():
+            if not descriptions and pi in self.parent:
+                descriptions = descriptions_by_block.get(self.find(pi), {})
+            resolved[pi] = list(descriptions)
+        return resolved
+
+class ProjectSearchIndex:
+    '''
+    Inverted index over the group title, PI name, department and description of the projects on the web page,
+    with the number of projects per department as facets.
+    The tokens are kept sorted, so the tokens starting with a prefix are one range found by bisection.
+    '''
+
+    # Lowercase letters and digits, tokens shorter than MIN_TOKEN_LENGTH are not indexed
+    TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+    MIN_TOKEN_LENGTH = 2
+
+    def __init__(self, documents, tokens, postings):
+        '''
+        Constructor for ProjectSearchIndex
+
+        documents: [group title, PI name, department] of every project, a project is its position in the list
+        tokens: The indexed tokens, sorted
+        postings: The sorted projects of each token, parallel to tokens
+        '''
+        self.documents = documents
+        self.tokens = tokens
+        self.postings = postings
+
+    @classmethod
+    def tokenize(cls, text)->list:
+        '''
+        Return the tokens of text
+        '''
+        return [token for token in cls.TOKEN_PATTERN.findall(str(text or "").lower()) if len(token) >= cls.MIN_TOKEN_LENGTH]
+
+    @classmethod
+    def build(cls, projects):
+        '''
+        Index ProjectRecords
+        '''
+        documents = []
+        postings_by_token = {}
+        for number, project in enumerate(projects):
+            department = (project.PI_department or "").strip()
+            documents.append([project.group_title, project.PI_name, department])
+
+            for text in (project.group_title, project.PI_name, department, project.description):
+                for token in cls.tokenize(text):
+                    postings = postings_by_token.setdefault(token, [])
+                    if not postings or postings[-1] != number:
+                        postings.append(number)
+
+        tokens = sorted(postings_by_token)
+        return cls(documents, tokens, [postings_by_token[token] for token in tokens])
+
+    def prefix_range(self, prefix)->range:
+        '''
+        Return the positions of the tokens starting with prefix
+        '''
+        low = bisect.bisect_left(self.tokens, prefix)
+        high = bisect.bisect_left(self.tokens, prefix + "\uffff")
+        return range(low, high)
+
+    def search(self, query, department=None)->list:
+        '''
+        Return the projects matching every token of query, each token as a prefix,
+        optionally only those of department. An empty query matches every project.
+        '''
+        matches = None
+        for token in self.tokenize(query):
+            projects = set()
+            for position in self.prefix_range(token):
+                projects.update(self.postings[position])
+            matches = projects if matches is None else matches & projects
+            if not matches:
+                return []
+
+        if matches is None:
+            matches = range(len(self.documents))
+        if department is not None:
+            matches = [number for number in matches if self.documents[number][2] == department]
+        return sorted(matches)
+
+    def facets(self, projects=None)->dict:
+        '''
+        Return the number of projects per department, of projects or of every project
+        '''
+        counts = {}
+        for number in (range(len(self.documents)) if projects is None else projects):
+            department = self.documents[number][2]
+            counts[department] = counts.get(department, 0) + 1
+        return dict(sorted(counts.items()))
+
+    def as_dict(self)->dict:
+        '''
+        Return the index as a JSON serializable dictionary
+        '''
+        return {
+            "schema_version": JSON_SCHEMA_VERSION,
+            "token_pattern": self.TOKEN_PATTERN.pattern,
+            "min_token_length": self.MIN_TOKEN_LENGTH,
+            "documents": self.documents,
+            "tokens": self.tokens,
+            "postings": self.postings,
+            "facets": {"department": self.facets()}
+        }
+
+    @classmethod
+    def from_dict(cls, index):
+        '''
+        Return the index stored by as_dict
+        '''
+        return cls(index["documents"], index["tokens"], index["postings"])
+
+class ProjectRegistry:
+    '''
+    Active Metis projects keyed by group title, with a secondary index by PI.
+    Iterating the registry yields the projects in insertion order.
+    '''
+
+    def __init__(self):
+        '''
+        Constructor for ProjectRegistry
+        '''
+        self.projects_by_title = {}
+        self.projects_by_pi = {}
+
+    def add(self, project)->None:
+        '''
+        Add a project, replacing any project with the same group title
+        '''
+        group_title = project.group_title
+        previous = self.projects_by_title.get(group_title)
+        if previous is not None:
+            self.projects_by_pi[previous.PI].remove(previous)
+
+        self.projects_by_title[group_title] = project
+        self.projects_by_pi.setdefault(project.PI, []).append(project)
+
+    def get(self, group_title):
+        '''
+        Return the project for group_title, or None
+        '''
+        return self.projects_by_title.get(group_title)
+
+    def by_pi(self, pi)->list:
+        '''
+        Return the projects owned by pi
+        '''
+        return self.projects_by_pi.get(pi, [])
+
+    def values(self)->list:
+        '''
+        Return the projects as a list, in insertion order
+        '''
+        return list(self.projects_by_title.values())
+
+    def __iter__(self):
+        return iter(self.projects_by_title.values())
+
+    def __len__(self)->int:
+        return len(self.projects_by_title)
+
+    def __contains__(self, group_title)->bool:
+        return group_title in self.projects_by_title
+
+class StageMetrics:
+    '''
+    Opt-in instrumentation of the MetisProjects stages.
+    Records the calls, wall time, CPU time and counters (bytes read and written,
+    rows parsed, lookups and matches) of every stage, keyed by stage name.
+    Times of a stage include the stages it calls, profiles do not.
+    '''
+
+    # Counters every stage reports, even when they stayed 0
+    COUNTERS = ("bytes_read", "bytes_written", "rows_parsed", "lookups", "matches")
+
+    def __init__(self, profile=False):
+        '''
+        Constructor for StageMetrics
+
+        profile: Also run every stage under its own cProfile profiler
+        '''
+        self.profile = profile
+        self.stages = {}
+        self.profilers = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+        # Stages running in each thread, innermost last
+        self.local = threading.local()
+
+    def stage_stack(self)->list:
+        '''
+        Return the stages running in the current thread
+        '''
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def stage_data(self, name)->dict:
+        '''
+        Return the metrics of stage name, adding the stage on first use
+        '''
+        if name not in self.stages:
+            self.stages[name] = {
+                "calls": 0,
+                "wall_seconds": 0.0,
+                "cpu_seconds": 0.0,
+                "counters": dict.fromkeys(self.COUNTERS, 0)
+            }
+        return self.stages[name]
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        '''
+        Record the time and counters of the code run within the context as stage name
+        '''
+        stack = self.stage_stack()
+
+        # cProfile can only profile one stage at a time, so only the main thread is profiled
+        # and a stage pauses the profiler of the stage that called it
+        profiling = self.profile and threading.current_thread() is threading.main_thread()
+        if profiling:
+            if stack:
+                self.profilers[stack[-1]].disable()
+            profiler = self.profilers.setdefault(name, cProfile.Profile())
+            profiler.enable()
+
+        stack.append(name)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            wall_seconds = time.perf_counter() - wall_start
+            cpu_seconds = time.thread_time() - cpu_start
+            stack.pop()
+
+            if profiling:
+                profiler.disable()
+                if stack:
+                    self.profilers[stack[-1]].enable()
+
+            with self.lock:
+                data = self.stage_data(name)
+                data["calls"] += 1
+                data["wall_seconds"] += wall_seconds
+                data["cpu_seconds"] += cpu_seconds
+
+    def count(self, counter, amount=1)->None:
+        '''
+        Add amount to counter of the innermost stage running in the current thread
+        '''
+        stack = self.stage_stack()
+        if not stack:
+            return
+        with self.lock:
+            counters = self.stage_data(stack[-1])["counters"]
+            counters[counter] = counters.get(counter, 0) + amount
+
+    def summary(self)->dict:
+        '''
+        Return the recorded metrics as a JSON serializable dictionary
+        '''
+        return {
+            "started": self.started,
+            "wall_seconds": time.time() - self.started,
+            "stages": self.stages
+        }
+
+    def write_json(self, filename)->None:
+        '''
+        Write the summary as JSON to filename
+        '''
+        with open(filename, "w") as file:
+            json.dump(self.summary(), file, indent=2)
+
+    def write_prometheus(self, filename)->None:
+        '''
+        Write the metrics in the Prometheus text format, for the node_exporter textfile collector.
+        The file is replaced atomically so the collector never reads a partial file.
+        '''
+        lines = [
+            "# HELP metis_projects_run_started_seconds Unix time the run started.",
+            "# TYPE metis_projects_run_started_seconds gauge",
+            f"metis_projects_run_started_seconds {self.started:.3f}",
+            "# HELP metis_projects_run_wall_seconds Wall time of the run.",
+            "# TYPE metis_projects_run_wall_seconds gauge",
+            f"metis_projects_run_wall_seconds {time.time() - self.started:.6f}"
+        ]
+
+        metrics = [
+            ("calls", "Times the stage ran.", lambda data: data["calls"]),
+            ("wall_seconds", "Wall time of the stage.", lambda data: data["wall_seconds"]),
+            ("cpu_seconds", "CPU time of the stage.", lambda data: data["cpu_seconds"])
+        ]
+        counters = sorted({counter for data in self.stages.values() for counter in data["counters"]})
+        metrics += [
+            (counter, f"Stage counter {counter}.", lambda data, counter=counter: data["counters"].get(counter, 0))
+            for counter in counters
+        ]
+
+        for metric, help_text, value in metrics:
+            lines.append(f"# HELP metis_projects_stage_{metric} {help_text}")
+            lines.append(f"# TYPE metis_projects_stage_{metric} gauge")
+            for name, data in sorted(self.stages.items()):
+                stage_label = name.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'metis_projects_stage_{metric}{{stage="{stage_label}"}} {value(data)}')
+
+        directory = os.path.dirname(os.path.abspath(filename))
+        with tempfile.NamedTemporaryFile(mode="w", dir=directory, delete=False) as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(file.name, filename)
+
+    def write_profiles(self, directory)->None:
+        '''
+        Dump the cProfile stats of every stage to directory, one <stage>.prof file each
+        '''
+        os.makedirs(directory, exist_ok=True)
+        for name, profiler in self.profilers.items():
+            filename = re.sub(r"[^\w.-]+", "_", name) + ".prof"
+            profiler.dump_stats(os.path.join(directory, filename))
+
+class Pipeline:
+    '''
+    Runs PipelineStages in dependency order, a stage starts as soon as the stages writing its inputs
+    finished, so independent stages overlap in a thread pool.
+    Inputs no stage writes are files already on disk.
+    '''
+
+    def __init__(self, stages):
+        '''
+        Constructor for Pipeline
+
+        stages: The PipelineStages, in the order they are started when several are ready
+
+        Raises ValueError if two stages have the same name or write the same resource,
+        or if stages depend on each other in a cycle, e.g. a stage reading its own output
+        '''
+        self.stages = {}
+        self.producers = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate pipeline stage: {stage.name}")
+            self.stages[stage.name] = stage
+
+            for output in stage.outputs:
+                if output in self.producers:
+                    raise ValueError(f"{output} is written by both {self.producers[output]} and {stage.name}")
+                self.producers[output] = stage.name
+
+        # Topological sort, the stages left over are on a cycle or wait for one
+        waiting_for = {name: self.dependencies(name) for name in self.stages}
+        ready = [name for name, dependencies in waiting_for.items() if not dependencies]
+        while ready:
+            name = ready.pop()
+            del waiting_for[name]
+            for other, dependencies in waiting_for.items():
+                if name in dependencies:
+                    dependencies.discard(name)
+                    if not dependencies:
+                        ready.append(other)
+        if waiting_for:
+            raise ValueError(f"Pipeline stages depend on each other in a cycle: {', '.join(waiting_for)}")
+
+    def dependencies(self, name)->set:
+        '''
+        Return the stages writing an input of stage name
+        '''
+        return {self.producers[resource] for resource in self.stages[name].inputs if resource in self.producers}
+
+    def select(self, targets=None)->list:
+        '''
+        Return the names of the targets and every stage they depend on, in stage order.
+        Every stage is selected when targets is None.
+
+        Raises ValueError for an unknown target
+        '''
+        if targets is None:
+            return list(self.stages)
+
+        selected = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in self.stages:
+                raise ValueError(f"Unknown pipeline stage: {name}, choose from {', '.join(self.stages)}")
+            if name not in selected:
+                selected.add(name)
+                pending.extend(self.dependencies(name))
+
+        return [name for name in self.stages if name in selected]
+
+    def downstream(self, resources)->list:
+        '''
+        Return the names of the stages reading one of resources, directly or through
+        the outputs of other stages, in stage order
+        '''
+        selected = set()
+        pending = set(resources)
+        while pending:
+            resource = pending.pop()
+            for stage in self.stages.values():
+                if resource in stage.inputs and stage.name not in selected:
+                    selected.add(stage.name)
+                    pending.update(stage.outputs)
+
+        return [name for name in self.stages if name in selected]
+
+    def run(self, metis_projects, targets=None, workers=PIPELINE_WORKERS)->list:
+        '''
+        Run the targets (every stage by default) and the stages they depend on,
+        each recorded as a metrics stage of its name
+
+        workers: Stages running at the same time, 1 runs them one by one in stage order on this thread
+
+        Returns the names of the stages run
+        Raises the exception of the first stage that failed, once the running stages finished
+        '''
+        selected = self.select(targets)
+        waiting_for = {name: self.dependencies(name) & set(selected) for name in selected}
+
+        def run_stage(stage):
+            with metis_projects.stage(stage.name):
+                stage.run(metis_projects)
+
+        # StageMetrics only profiles the main thread, so profiled stages run one by one on it
+        profiling = metis_projects.metrics is not None and metis_projects.metrics.profile
+        if workers <= 1 or profiling:
+            while waiting_for:
+                name = next(name for name, dependencies in waiting_for.items() if not dependencies)
+                del waiting_for[name]
+                run_stage(self.stages[name])
+                for dependencies in waiting_for.values():
+                    dependencies.discard(name)
+            return selected
+
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            running = {}
+            while waiting_for or running:
+                for name in [name for name, dependencies in waiting_for.items() if not dependencies]:
+                    del waiting_for[name]
+                    running[executor.submit(run_stage, self.stages[name])] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    future.result()
+                    for dependencies in waiting_for.values():
+                        dependencies.discard(name)
+
+        return selected
+
+def instrumented_stage(method):
+    '''
+    Record the MetisProjects method as a stage of the same name when metrics are enabled
+    '''
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.stage(method.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class MetisProjects:
+
+    def __init__(self, metis_users_csv=METIS_USERS_CSV, metis_pis_csv=METIS_PIS_CSV, metis_pi_lastlog_csv=METIS_PI_LASTLOG_CSV,
+                 accounting_cache=None, public_html_dir=None):
+        '''
+        Constructor for MetisProjects
+        
+        metis_users_csv: Accounting export of all Metis users
+        metis_pis_csv: Accounting export of all Metis PIs
+        metis_pi_lastlog_csv: Accounting export of the PIs last logins
+        accounting_cache: AccountingCache the exports are loaded through, None to parse them every time
+        public_html_dir: Directory the html is published to, PUBLIC_HTML_DIR by default
+        '''
+        self.metis_users_csv = metis_users_csv
+        self.metis_pis_csv = metis_pis_csv
+        self.metis_pi_lastlog_csv = metis_pi_lastlog_csv
+        self.accounting_cache = accounting_cache
+        self.public_html_dir = public_html_dir
+        
+        # Stores all active PI's and their projects
+        self.active_metis_projects = ProjectRegistry()
+        self.disabled_pis = [] 
+        self.active_pis = []
+        self.ids_by_email = {}
+        self.missing_pi_department = {
+            "piot" : "Physics",
+            "yyin" : "Chemistry & Biochemistry",
+            "hedin" : "Physics"
+        }
+        self.updated_project_descriptions = {
+            "AML" : "The AML project is for research in machine learning, federated learning and optimization.",
+            "ATLAS" : "The ATLAS group searches for new particles beyond the Standard Model, focusing on final states with multiple heavy quarks.",
+            "AVLAB" : "Analyzing large spatial datasets to understand the factors affecting US Hospitals' success requires considering a very detailed spatial context for each health facility.",
+            "AVLAB2" : "The study of how participants of a federated fine-tuning regime can achieve an equilibrium, where every member is sufficiently incentivized to participate.",
+            "LINLAB" : "LINLAB is a NIU research team that works on the quadruped robots as guide dogs for the visually impaired population.",
+            "PCT" : "The pcT (proton computed Tomography) project focuses on reconstructing 3D tomographic medical images using protons. These high-resolution images are used to support post-diagnosis, proton-based cancer treatment by improving the accuracy of proton dose delivery. Innovations from the pcT project have led to four U.S. patents and five international patents.",
+            "PRAD" : "The PRAD (Proton Radiography) project is dedicated to reconstructing 2D radiographic medical images using protons. These images play a vital role in post-diagnosis, proton-based cancer treatment by enhancing treatment planning and verification. Innovations from the PRAD project have contributed to four U.S. patents and five international patents.",
+            "REDCAP" : "REDCap is a secure web platform for building and managing online databases and surveys. It is available to NIU faculty, staff, and students for use in research projects.",
+            "ZWLAB" : "Developing iGAIT a smartphone-based tool that uses machine learning and video gait analysis to help detect early signs of autism in children."
+        }
+        self.archived_metis_projects = [
+            "chem600s2017",
+            "aard",
+            "cmodel",
+            "fast",
+            "hedin",
+            "jahreda",
+            "npohlman",
+            "piot",
+            "ritelab",
+            "syphers",
+            "resx",
+            "bios641"
+        ]
+        self.pi_and_project_descriptions = {}
+        self.black_list_projects = []
+
+        # Filled in by validate_projects, None until the projects were validated
+        self.valid_projects = None
+        self.excluded_projects = {}
+        
+        # Parsed contents of metis_project_groups.txt, filled in by load_project_groups
+        self.extracted_project_data = {}
+        self.project_groups_source = None
+        self.membership_index = MembershipIndex()
+        
+        # Parsed contents of metis_project_description.txt, filled in by load_project_descriptions
+        self.description_by_pi = {}
+        self.consecutive_pi_lines = []
+        self.project_descriptions_by_pi = {}
+        self.project_descriptions_source = None
+        
+        # LastLoginIndex for each lastlog file read, keyed by filename
+        self.last_login_indexes = {}
+        
+        # Output files rewritten during this run
+        self.written_outputs = []
+        
+        # StageMetrics of this run, None unless instrumentation is enabled
+        self.metrics = None
+        
+    def stage(self, name):
+        '''
+        Return a context recording the code run within it as stage name, when metrics are enabled
+        '''
+        if self.metrics is None:
+            return contextlib.nullcontext()
+        return self.metrics.stage(name)
+
+    def count(self, counter, amount=1)->None:
+        '''
+        Add amount to counter of the running stage, when metrics are enabled
+        '''
+        if self.metrics is not None:
+            self.metrics.count(counter, amount)
+
+    def query_and_write_file(self, command, filename, timeout=QUERY_TIMEOUT, line_callback=None)-> int:
+        '''
+        Run a comand and stream the results to a file as they arrive.
+        The file is only replaced once the command succeeded, and only if its content changed.
+
+        command: Command to be executed
+        filename: File to be written to
+        timeout: Seconds the command may run before it is killed
+        line_callback: Optional function called with every line of output
+        
+        Returns the number of characters written
+        Raises subprocess.TimeoutExpired or subprocess.CalledProcessError if the command hangs or fails
+        '''
+        with self.stage(f"query_and_write_file:{os.path.basename(filename)}"):
+            output_size = 0
+            output_lines = 0
+            directory = os.path.dirname(os.path.abspath(filename))
+
+            std_out = tempfile.NamedTemporaryFile(mode="w", dir=directory, delete=False)
+            try:
+                with tempfile.TemporaryFile(mode="w+") as std_err, std_out:
+
+                    # Execute the command on machine, in its own process group
+                    # so a timeout kills every command in a pipeline
+                    process = subprocess.Popen(
+                        command, shell=True, stdout=subprocess.PIPE, 
+                        stderr=std_err, universal_newlines=True, start_new_session=True
+                    )
+                    timer = threading.Timer(timeout, os.killpg, (process.pid, signal.SIGKILL))
+                    timer.start()
+                    try:
+                        for line in process.stdout:
+                            std_out.write(line)
+                            output_size += len(line)
+                            output_lines += 1
+                            if line_callback is not None:
+                                line_callback(line)
+                        returncode = process.wait()
+                    finally:
+                        timed_out = not timer.is_alive()
+                        timer.cancel()
+                        # Kill what is left of the pipeline if the callback or a write failed
+                        if process.poll() is None:
+                            with contextlib.suppress(ProcessLookupError):
+                                os.killpg(process.pid, signal.SIGKILL)
+                            process.wait()
+                        process.stdout.close()
+
+                    std_err.seek(0)
+                    error_output = std_err.read()
+
+                self.count("bytes_read", output_size)
+                self.count("rows_parsed", output_lines)
+
+                if timed_out:
+                    raise subprocess.TimeoutExpired(command, timeout, stderr=error_output)
+                if returncode != 0:
+                    raise subprocess.CalledProcessError(returncode, command, stderr=error_output)
+                if error_output:
+                    print(f"{command}: {error_output.strip()}", file=sys.stderr)
+
+                # Leave the file untouched if the output did not change,
+                # its modification time still records when it was last queried
+                if os.path.exists(filename) and filecmp.cmp(std_out.name, filename, shallow=False):
+                    os.utime(filename)
+                    return output_size
+
+                os.replace(std_out.name, filename)
+                self.written_outputs.append(filename)
+                self.count("bytes_written", output_size)
+            finally:
+                if os.path.exists(std_out.name):
+                    os.remove(std_out.name)
+
+            return output_size
+
+    @instrumented_stage
+    def query_and_write_files(self, queries, timeout=QUERY_TIMEOUT)->dict:
+        '''
+        Run independent queries concurrently with query_and_write_file
+
+        queries: List of (command, filename, line_callback) tuples
+        timeout: Seconds each command may run before it is killed
+        
+        Returns the number of characters written, keyed by filename
+        '''
+        with ThreadPoolExecutor(max_workers=max(len(queries), 1)) as executor:
+            futures = {
+                filename: executor.submit(self.query_and_write_file, command, filename, timeout, line_callback)
+                for command, filename, line_callback in queries
+            }
+            return {filename: future.result() for filename, future in futures.items()}
+
+    @staticmethod
+    def iter_ldap_descriptions(lines):
+        '''
+        Yield the description values of LDIF lines,
+        descriptions spanning several lines are joined into one
+        '''
+        for entry in iter_ldif_records(lines):
+            for description in entry.get("description", ()):
+                yield " ".join(part.strip() for part in description.splitlines())
+
+    @instrumented_stage
+    def write_project_description_file(self, filename=PROJECT_DESCRIPTION_FILE, ldif_filename=PROJECT_DESCRIPTION_LDIF)->None:
+        '''
+        Write the descriptions of the LDAP query, one "description: value" line each,
+        streamed from the LDIF file the query wrote
+        
+        filename: File to be written to
+        ldif_filename: The LDIF written by the LDAP query
+        '''
+        self.count("bytes_read", os.path.getsize(ldif_filename))
+        with open(ldif_filename, "r") as ldif_file:
+            self.write_output(filename, (f"description: {description}\n" for description in self.iter_ldap_descriptions(ldif_file)))
+
+    def write_output(self, filename, content)->bool:
+        '''
+        Write content to filename, unless the file already holds exactly that content
+        
+        filename: File to be written to
+        content: The file contents, a string or an iterable of strings written as they are produced
+        
+        Returns True if the file was written
+        '''
+        if isinstance(content, str):
+            content = (content,)
+        return self.write_output_chunks(filename, content)
+
+    def write_output_chunks(self, filename, chunks)->bool:
+        '''
+        Stream chunks of text through a buffered temp file next to filename,
+        and replace filename with it unless the file already holds exactly that content
+
+        filename: File to be written to
+        chunks: Iterable of strings making up the file contents
+
+        Returns True if the file was written
+        '''
+        size = 0
+        directory = os.path.dirname(os.path.abspath(filename))
+        file = tempfile.NamedTemporaryFile(mode="w", dir=directory, delete=False, buffering=1 << 16)
+        try:
+            with file:
+                for chunk in chunks:
+                    file.write(chunk)
+                    size += len(chunk)
+
+            if os.path.exists(filename):
+                if filecmp.cmp(file.name, filename, shallow=False):
+                    return False
+                shutil.copymode(filename, file.name)
+            else:
+                os.chmod(file.name, 0o644)
+            os.replace(file.name, filename)
+        finally:
+            if os.path.exists(file.name):
+                os.remove(file.name)
+
+        self.written_outputs.append(filename)
+        self.count("bytes_written", size)
+        return True
+
+    def parse_project_groups(self, lines):
+        '''
+        Single pass over the lines of metis_project_groups.txt
+        yielding DisabledPI, UserEmail and GroupEntry events
+        
+        lines: Iterable of lines from the groups file
+        '''
+        for line in lines:
+
+            # Skip empty lines
+            if not line:
+                continue
+
+            match_disabled_pi = DISABLED_PI_PATTERN.match(line)
+            if match_disabled_pi:
+                yield DisabledPI(match_disabled_pi.group(1))
+                continue
+
+            for match in USER_EMAIL_PATTERN.findall(line):
+                yield UserEmail(match[0], match[1])
+
+            match = GROUP_ENTRY_PATTERN.match(line)
+            if match:
+                key, kind, value = match.groups() # Return a tuple of matched groups
+                yield GroupEntry(key, kind, value.strip())
+
+    @instrumented_stage
+    def load_project_groups(self, filename=PROJECT_GROUPS_FILE)->None:
+        '''
+        Read the groups file once and store the disabled PIs, 
+        IDs and emails, and the -pi/-members entries for every later stage
+        
+        filename: The file to read from
+        '''
+        # The file has already been parsed
+        if self.project_groups_source == filename:
+            return
+
+        self.reset_project_groups()
+        self.count("bytes_read", os.path.getsize(filename))
+        with open(filename, "r") as file:
+            self.add_project_groups_lines(file)
+
+        self.project_groups_source = filename
+
+    def reset_project_groups(self)->None:
+        '''
+        Clear the parsed groups file state
+        '''
+        self.disabled_pis = []
+        self.ids_by_email = {}
+        self.extracted_project_data = {}
+        self.project_groups_source = None
+        self.membership_index = MembershipIndex()
+
+    def add_project_groups_lines(self, lines)->None:
+        '''
+        Parse lines of the groups file into the disabled PIs, 
+        IDs and emails, and the -pi/-members entries
+        
+        lines: Iterable of lines from the groups file
+        '''
+        rows = 0
+        for event in self.parse_project_groups(lines):
+            rows += 1
+            if isinstance(event, GroupEntry):
+                self.extracted_project_data[event.key] = event.value
+                if event.kind == "members":
+                    self.membership_index.add(event.key[:-8], event.value)
+            elif isinstance(event, UserEmail):
+                self.ids_by_email.setdefault(event.email, []).append(event.ID)
+            else:
+                self.disabled_pis.append(event.pi)
+
+        self.count("rows_parsed", rows)
+
+    def add_project_groups_line(self, line)->None:
+        '''
+        Parse a single line of the groups file, used to parse the groups query as it streams in
+        '''
+        self.add_project_groups_lines((line,))
+
+    @instrumented_stage
+    def write_disabled_pis(self, filename=PROJECT_GROUPS_FILE)->None:
+        '''
+        Write all disabled pis to disabled_pis.txt
+        
+        filename: The file to read the data from
+        '''
+        self.load_project_groups(filename)
+
+        self.write_output("./disabled_pis.txt", (element + "\n" for element in self.disabled_pis))
+
+    @instrumented_stage
+    def write_archived_metis_projects(self, filename=PROJECT_GROUPS_FILE) -> None:
+        ''''
+        Store and write all archived metis projects
+        '''
+        self.load_project_groups(filename)
+        disabled_pis = set(self.disabled_pis)
+
+        # The -members entries of groups named after a disabled PI
+        for key, value in self.extracted_project_data.items():
+            if not key.endswith("-members") or key[:-8] not in disabled_pis:
                 continue
-            else:  
-                project_count += 1
+
+            pi = key[:-8]
+            project = ProjectRecord(pi, pi)
+            project.set_members(value, self.membership_index.members(pi))
+
+            self.archived_metis_projects.append(project)
+
+        formatted_values = (
+            pprint.pformat(value.as_archived_dict() if isinstance(value, ProjectRecord) else value) + "\n\n"
+            for value in self.archived_metis_projects
+        )
+        self.write_output("archived_metis_projects.txt", formatted_values)
+        
+    @instrumented_stage
+    def write_active_pis(self, filename=PROJECT_GROUPS_FILE)->None:
+        '''
+        Write all active pis to active_pis.txt
+        
+        filename: The file
+        '''
+        self.load_project_groups(filename)
+
+        # The values of the PI lines
+        self.active_pis = [value for key, value in self.extracted_project_data.items() if key.endswith("-pi")]
+                
+        self.write_output("./active_pis.txt", (element + "\n" for element in self.active_pis))
+            
+    def extract_project_pi_and_members(self, filename=PROJECT_GROUPS_FILE)->dict:
+        ''''
+        Return the PI and group members for each project on Metis,
+        keyed by groupname-pi and groupname-members
+        
+        filename: The file to read from
+        '''
+        self.load_project_groups(filename)
+
+        return self.extracted_project_data
+     
+    @instrumented_stage
+    def assign_project_data(self, extracted_project_data)->None:
+        ''''
+        Handles the extracted PI and team members 
+        and appends the project data to active_metis_projects
+        
+        extracted_project_data: The extracted project data read from the file
+        '''
+        
+        # Iterate through the matched lines 
+        # key:   groupname-pi, or groupname-members
+        # value: Either the PI name or names of the group members
+        for key, value in extracted_project_data.items():
             
-        return project_count
+            # Evaluate PI lines
+            if key.endswith("-pi"):
+                self.active_metis_projects.add(ProjectRecord(key[:-3], value))
+                        
+            if key.endswith("-members"):
+                project = self.active_metis_projects.get(key[:-8])
+                self.count("lookups")
+                if project is not None:
+                    project.set_members(value, self.membership_index.members(key[:-8]))
+                    self.count("matches")
+
+    @instrumented_stage
+    def assign_pi_name_and_department(self)->None:
+        '''
+        Cross references the PI, with data in metis_users.csv
+        to assign the PIs email and department info in active_metis_projects
+        '''
+        ids_by_email = self.ids_by_email
+
+        lookups = matches = 0
+        for email, (name, department) in self.accounting_table(self.metis_users_csv, "users").items():
+
+            # If the email matches get the name and department
+            lookups += 1
+            for pid in ids_by_email.get(email, ()):
+                for project in self.active_metis_projects.by_pi(pid):
+                    matches += 1
+                    project.PI_email = email
+                    project.PI_name = name
+                    project.set_department(department)
+        
+        # Projects still missing a department fall back on metis_pis.csv,
+        # the first non-empty department listed for the PIs name is used
+        department_by_name = self.accounting_table(self.metis_pis_csv, "pis")
+
+        for data in self.active_metis_projects:
+            if data.PI_department == "":
+                lookups += 1
+                if data.PI_name in department_by_name:
+                    matches += 1
+                    data.set_department(department_by_name[data.PI_name])
+
+        self.count("lookups", lookups)
+        self.count("matches", matches)
+
+    def accounting_table(self, filename, kind)->dict:
+        '''
+        Return the parsed table of an accounting export, through the accounting cache if there is one
+
+        kind: "users", "pis" or "lastlog", see AccountingCache.COLUMNS
+        '''
+        if self.accounting_cache is not None:
+            table, rows = self.accounting_cache.load(filename, kind)
+        else:
+            table, rows = AccountingCache.parse(filename, kind)
+
+        # Nothing was parsed when the table came from the cache
+        if rows is not None:
+            self.count("bytes_read", os.path.getsize(filename))
+            self.count("rows_parsed", rows)
+        return table
+    
+    def last_login_index(self, filename=None)->LastLoginIndex:
+        '''
+        Return the LastLoginIndex for filename (metis_pi_lastlog.csv by default), reading the file on first use
+        '''
+        if filename is None:
+            filename = self.metis_pi_lastlog_csv
+        if filename not in self.last_login_indexes:
+            self.last_login_indexes[filename] = LastLoginIndex(filename, self.accounting_table(filename, "lastlog"))
+        return self.last_login_indexes[filename]
+
+    def get_pi_last_log(self, pi_email, filename=None)->str:
+        '''
+        Return the PIs last login date from metis_pi_lastlog.csv
+        '''
+        return self.last_login_index(filename).get(pi_email)
+    
+    @instrumented_stage
+    def assign_pi_last_log(self)->None:
+        '''
+        Add the PIs last log to the PIs group
+        '''
+        active_pis = set(self.active_pis)
+
+        lookups = matches = 0
+        for project in self.active_metis_projects:
+            if project.PI in active_pis:
+                pi_last_log = self.get_pi_last_log(pi_email=project.PI_email)
+                project.pi_last_login = pi_last_log
+                lookups += 1
+                matches += pi_last_log is not None
+
+        self.count("lookups", lookups)
+        self.count("matches", matches)
+    
+    @instrumented_stage
+    def load_project_descriptions(self, filename=PROJECT_DESCRIPTION_FILE)->None:
+        '''
+        Read the description file once, line by line, and store for every later stage
+           -description_by_pi            : The DESCRIPTION line directly following each PI line
+           -consecutive_pi_lines         : Runs of 2+ consecutive PI lines
+           -project_descriptions_by_pi   : Every DESCRIPTION following a PI, as ordered sets
+        
+        filename: The file to read from
+        '''
+        # The file has already been parsed
+        if self.project_descriptions_source == filename:
+            return
+
+        description_by_pi = {}
+        consecutive_pi_lines = []
+        project_descriptions_by_pi = {}
+
+        pending_pi = None   # PI on the previous line, waiting for its DESCRIPTION
+        current_group = []  # Consecutive PI lines read so far
+        current_pi = None   # Last PI read after the 2 header lines
+        line_number = -1
+
+        with open(filename, "r") as file:
+            for line_number, line in enumerate(file):
+                line = line.rstrip("\n")
+                is_pi = line.startswith(DESCRIPTION_PI_PREFIX)
+                is_description = line.startswith(DESCRIPTION_TEXT_PREFIX)
+
+                # A DESCRIPTION only belongs to a PI on the line right before it
+                previous_pi, pending_pi = pending_pi, None
+                if is_description and previous_pi is not None:
+                    description = line[len(DESCRIPTION_TEXT_PREFIX):]
+                    if description:
+                        description_by_pi[previous_pi] = description.strip()
+
+                if is_pi:
+                    pi = line[len(DESCRIPTION_PI_PREFIX):]
+                    current_group.append(pi.strip())
+                    if pi:
+                        pending_pi = pi.strip()
+                        description_by_pi[pending_pi] = "No description found"
+                else:
+                    # Only store groups with 2+ PI lines
+                    if len(current_group) > 1:
+                        consecutive_pi_lines.append(current_group)
+                    current_group = []
+
+                # Skip the first 2 lines, and ignore this
+                if line_number < 2 or "description: AFFILIATION=Hewlett-Packard" in line:
+                    continue
+
+                if is_pi:
+                    current_pi = line[len(DESCRIPTION_PI_PREFIX):].strip()
+                    project_descriptions_by_pi.setdefault(current_pi, {})
+                elif is_description and current_pi is not None:
+                    project_descriptions_by_pi[current_pi][line[len(DESCRIPTION_TEXT_PREFIX):].strip()] = None
+
+        if len(current_group) > 1:
+            consecutive_pi_lines.append(current_group)
+
+        self.count("bytes_read", os.path.getsize(filename))
+        self.count("rows_parsed", line_number + 1)
+
+        self.description_by_pi = description_by_pi
+        self.consecutive_pi_lines = consecutive_pi_lines
+        self.project_descriptions_by_pi = project_descriptions_by_pi
+        self.project_descriptions_source = filename
+
+    @instrumented_stage
+    def assign_project_descriptions(self, filename=PROJECT_DESCRIPTION_FILE)->None:
+        ''''
+        Assign the group their project description
+        '''
+        # This code is problamatic because 
+        # multiple PIs can be on 1 project
+        # A PI can have multiple projects
+        self.load_project_descriptions(filename)
+
+        matches = 0
+        for pi, description in self.description_by_pi.items():
+            for data in self.active_metis_projects.by_pi(pi):
+                data.description = description    
+                matches += 1
+
+        self.count("lookups", len(self.description_by_pi))
+        self.count("matches", matches)
+    
+    def consecutive_pi_lines_helper(self, filename=PROJECT_DESCRIPTION_FILE)->list:
+        ''''
+        Helper function to identify consecutive lines where 
+        multiple PIs are assigned to 1 or more projects
+        '''
+        self.load_project_descriptions(filename)
+
+        return self.consecutive_pi_lines
+
+    @instrumented_stage
+    def pis_and_projects(self, filename=PROJECT_DESCRIPTION_FILE) -> None:
+        '''
+        Retrieves the data for PIs and the projects they are working on
+        '''
+        self.load_project_descriptions(filename)
+
+        for pi, descriptions in self.project_descriptions_by_pi.items():
+            project_descriptions = self.pi_and_project_descriptions.setdefault(pi, [])
+
+            # Only add the descriptions not already in the list
+            known = set(project_descriptions)
+            project_descriptions.extend(description for description in descriptions if description not in known)
+
+    @instrumented_stage
+    def pis_missing_description_helper(self, filename=PROJECT_DESCRIPTION_FILE)->None:
+        '''
+        Handles PIs that have missing descriptions
+        and assigns them the descriptions of the PIs listed on consecutive lines with them
+        '''
+        graph = PIProjectGraph()
+        for pi, descriptions in self.pi_and_project_descriptions.items():
+            graph.add_descriptions(pi, descriptions)
+
+        consecutive_pi_lines = self.consecutive_pi_lines_helper(filename)
+        for group in consecutive_pi_lines:
+            graph.union(group)
+
+        self.pi_and_project_descriptions = graph.resolve()
+
+        self.count("lookups", len(consecutive_pi_lines))
+        self.count("matches", len(graph.parent))
+
+    @instrumented_stage
+    def resolve_pi_department_discrepancy(self)->None:
+        ''''
+        In the data we are working with some PIs
+        department data is not found, this function resolves this problme
+        '''
+        for project_pi, department in self.missing_pi_department.items():
+            for project in self.active_metis_projects.by_pi(project_pi):
+                project.set_department(department)
+                
+    @instrumented_stage
+    def fetch_active_metis_projects(self, workers=PIPELINE_WORKERS)->None:
+        '''
+        Build active_metis_projects from the groups file, and enrich the projects with the accounting
+        exports, the project descriptions and the PIs last logins, by running the fetch stages of pipeline()
+        '''
+        self.pipeline().run(self, ["archived_projects", "pi_descriptions", "project_descriptions", "last_login"], workers)
+
+    def pipeline(self, shard=None, page_size=50, catalog=None)->Pipeline:
+        '''
+        Return the Pipeline building every output file from the groups file, the description file
+        and the accounting exports
+
+        shard, page_size: Passed on to write_web_metis_project_data
+        catalog: Also store the run in this SQLite catalog
+        '''
+        stages = [
+            # Parse the inputs
+            PipelineStage("load_groups", [PROJECT_GROUPS_FILE], ["project_groups"],
+                          lambda metis_projects: metis_projects.load_project_groups()),
+            PipelineStage("load_descriptions", [PROJECT_DESCRIPTION_FILE], ["descriptions"],
+                          lambda metis_projects: metis_projects.load_project_descriptions()),
+            PipelineStage("load_last_logins", [self.metis_pi_lastlog_csv], ["last_logins"],
+                          lambda metis_projects: metis_projects.last_login_index()),
+            PipelineStage("disabled_pis", ["project_groups"], ["./disabled_pis.txt"],
+                          lambda metis_projects: metis_projects.write_disabled_pis()),
+            PipelineStage("active_pis", ["project_groups"], ["active_pis", "./active_pis.txt"],
+                          lambda metis_projects: metis_projects.write_active_pis()),
+
+            # Build and enrich the projects
+            PipelineStage("projects", ["project_groups"], ["projects"],
+                          lambda metis_projects: metis_projects.assign_project_data(metis_projects.extract_project_pi_and_members())),
+            PipelineStage("pi_details", ["projects", self.metis_users_csv, self.metis_pis_csv], ["pi_details"],
+                          lambda metis_projects: (metis_projects.assign_pi_name_and_department(),
+                                                  metis_projects.resolve_pi_department_discrepancy())),
+            PipelineStage("project_descriptions", ["projects", "descriptions"], ["project_descriptions"],
+                          lambda metis_projects: metis_projects.assign_project_descriptions()),
+            PipelineStage("pi_descriptions", ["descriptions"], ["pi_descriptions"],
+                          lambda metis_projects: (metis_projects.pis_and_projects(),
+                                                  metis_projects.pis_missing_description_helper())),
+            PipelineStage("archived_projects", ["project_groups"], ["archived_projects", "archived_metis_projects.txt"],
+                          lambda metis_projects: metis_projects.write_archived_metis_projects()),
+            PipelineStage("last_login", ["pi_details", "active_pis", "last_logins"], ["pi_last_login"],
+                          lambda metis_projects: metis_projects.assign_pi_last_log()),
+
+            # Write the enriched projects, before the descriptions are updated
+            PipelineStage("projects_txt", ["pi_details", "project_descriptions", "pi_last_login"], ["./web_metis_project_data.txt"],
+                          lambda metis_projects: metis_projects.write_active_metis_projects(metis_projects.active_metis_projects, "./web_metis_project_data.txt")),
+            PipelineStage("projects_json", ["pi_details", "project_descriptions", "pi_last_login"], ["./web_metis_project_data.json"],
+                          lambda metis_projects: metis_projects.write_active_metis_projects_json(metis_projects.active_metis_projects)),
+            PipelineStage("pi_descriptions_files", ["pi_descriptions"], ["./web_metis_pi_project_descriptions.txt"],
+                          lambda metis_projects: (metis_projects.write_pis_and_project_descriptions(metis_projects.pi_and_project_descriptions, "./web_metis_pi_project_descriptions.txt"),
+                                                  metis_projects.write_pis_and_project_descriptions_json(metis_projects.pi_and_project_descriptions))),
+            PipelineStage("memberships", ["pi_details"], ["./metis_project_memberships.json"],
+                          lambda metis_projects: metis_projects.write_memberships()),
+            PipelineStage("archived_json", ["archived_projects"], ["./archived_metis_projects.json"],
+                          lambda metis_projects: metis_projects.write_archived_metis_projects_json()),
+
+            # Decide which projects are shown on the web page
+            PipelineStage("update_descriptions", ["project_descriptions", "./web_metis_project_data.txt", "./web_metis_project_data.json"], ["updated_descriptions"],
+                          lambda metis_projects: metis_projects.update_project_descriptions()),
+            PipelineStage("validate", ["pi_details", "updated_descriptions", "archived_projects"], ["valid_projects"],
+                          lambda metis_projects: metis_projects.validate_projects()),
+            PipelineStage("excluded", ["valid_projects"], ["./excluded_metis_projects.txt"],
+                          lambda metis_projects: metis_projects.write_excluded_projects()),
+            PipelineStage("html", ["valid_projects"], ["web_project_html.txt"],
+                          lambda metis_projects: metis_projects.write_web_metis_project_data(shard=shard, page_size=page_size)),
+            PipelineStage("search_index", ["valid_projects"], ["./web_project_search.json"],
+                          lambda metis_projects: metis_projects.write_search_index())
+        ]
+
+        if catalog:
+            stages.append(PipelineStage("catalog", ["valid_projects", "pi_descriptions", "pi_last_login"], [catalog],
+                                        lambda metis_projects: metis_projects.write_catalog(catalog)))
+
+        return Pipeline(stages)
+
+    @instrumented_stage
+    def write_active_metis_projects(self, data, filename)->None:
+        ''''
+        Write the active metis project data to filename
+        ''' 
+        formatted_values = (
+            pprint.pformat(value.as_dict() if isinstance(value, ProjectRecord) else value) + "\n\n"
+            for value in data
+        )
+        self.write_output(filename, formatted_values)
+           
+    @instrumented_stage
+    def write_pis_and_project_descriptions(self, data, filename)->None:
+        ''''
+        Write the pis and their project descriptions to filename
+        '''
+        formatted_data = (f"{pi}:\n{pprint.pformat(descriptions, indent=4)}\n\n" for pi, descriptions in data.items())
+        self.write_output(filename, formatted_data)
+
+    def write_json_records(self, records, basename, name)->None:
+        '''
+        Write records to <basename>.jsonl, one compact JSON object per line, and to <basename>.json
+        as {"schema_version": JSON_SCHEMA_VERSION, name: [records]}. Each record is encoded once,
+        the .json file is streamed from the lines of the .jsonl file.
+        
+        records: Iterable of JSON serializable dictionaries
+        basename: Path of the files without extension
+        name: Key of the record list in the .json file
+        '''
+        self.write_output(basename + ".jsonl", (json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+
+        def json_chunks(lines):
+            yield f'{{"schema_version":{JSON_SCHEMA_VERSION},"{name}":['
+            for number, line in enumerate(lines):
+                yield ("," if number else "") + line.rstrip("\n")
+            yield "]}\n"
+
+        with open(basename + ".jsonl", "r") as jsonl_file:
+            self.write_output(basename + ".json", json_chunks(jsonl_file))
+
+    @instrumented_stage
+    def write_active_metis_projects_json(self, data, basename="./web_metis_project_data")->None:
+        '''
+        Write the active metis project data as JSON, with the fields of web_metis_project_data.txt
+        '''
+        self.write_json_records(
+            (value.as_dict() if isinstance(value, ProjectRecord) else value for value in data),
+            basename, "projects"
+        )
+
+    @instrumented_stage
+    def write_archived_metis_projects_json(self, basename="./archived_metis_projects")->None:
+        '''
+        Write the archived metis projects as JSON, archived titles without group data get null fields
+        '''
+        records = []
+        for value in self.archived_metis_projects:
+            if isinstance(value, ProjectRecord):
+                records.append(value.as_archived_dict())
+            else:
+                records.append({"group_title": value, "PI": None, "group_member_count": None})
+
+        self.write_json_records(records, basename, "projects")
+
+    @instrumented_stage
+    def write_pis_and_project_descriptions_json(self, data, basename="./web_metis_pi_project_descriptions")->None:
+        '''
+        Write the pis and their project descriptions as JSON, {"PI": pi, "descriptions": [...]} each
+        '''
+        records = [{"PI": pi, "descriptions": list(descriptions)} for pi, descriptions in data.items()]
+
+        self.write_json_records(records, basename, "pis")
     
+    def exclusion_reasons(self, group, archived_titles)->list:
+        '''
+        Return the reason codes for leaving group off the web page, empty if it is shown
+        '''
+        reasons = []
+        if group.PI_name is None:
+            reasons.append(EXCLUDED_MISSING_PI_NAME)
+        if group.PI_department is None or group.PI_department == "":
+            reasons.append(EXCLUDED_MISSING_DEPARTMENT)
+        if group.members is None:
+            reasons.append(EXCLUDED_NO_MEMBERS)
+        if group.description == "No description found":
+            reasons.append(EXCLUDED_NO_DESCRIPTION)
+        if group.group_title in archived_titles:
+            reasons.append(EXCLUDED_ARCHIVED)
+        return reasons
+
+    @instrumented_stage
+    def validate_projects(self)->list:
+        '''
+        Decide in one pass which projects are shown on the web page.
+        The others go to black_list_projects, with their reason codes in excluded_projects keyed by group title.
+        Run it once the projects are enriched, the web page and project count reuse the result.
+
+        Returns the valid projects
+        '''
+        # Only the archived titles listed by name, archived project records are groups of disabled PIs
+        archived_titles = {title for title in self.archived_metis_projects if isinstance(title, str)}
+
+        self.valid_projects = []
+        self.black_list_projects = []
+        self.excluded_projects = {}
+
+        for group in self.active_metis_projects:
+            reasons = self.exclusion_reasons(group, archived_titles)
+            if reasons:
+                self.black_list_projects.append(group)
+                self.excluded_projects[group.group_title] = reasons
+            else:
+                self.valid_projects.append(group)
+
+        self.count("matches", len(self.valid_projects))
+        return self.valid_projects
+
+    def visible_projects(self)->list:
+        '''
+        Return the projects shown on the web page, validating them first if needed
+        '''
+        if self.valid_projects is None:
+            self.validate_projects()
+        return self.valid_projects
+
+    @instrumented_stage
+    def valid_project_count(self)->int:
+        '''
+        Return the number of projects without 'None' entries
+
+        '''
+        return len(self.visible_projects())
+
+    @instrumented_stage
+    def write_excluded_projects(self, filename="./excluded_metis_projects.txt", basename="./excluded_metis_projects")->None:
+        '''
+        Write the projects left off the web page and why, "<group title> (<PI>): <reasons>" per line,
+        and as JSON with {"group_title", "PI", "reasons"} records
+        '''
+        self.visible_projects()
+
+        excluded = [(group, self.excluded_projects[group.group_title]) for group in self.black_list_projects]
+        self.write_output(filename, (f"{group.group_title} ({group.PI}): {', '.join(reasons)}\n" for group, reasons in excluded))
+        self.write_json_records(
+            ({"group_title": group.group_title, "PI": group.PI, "reasons": reasons} for group, reasons in excluded),
+            basename, "projects"
+        )
+
+    @instrumented_stage
+    def write_memberships(self, filename="./metis_project_memberships.json")->None:
+        '''
+        Write the membership index of the active projects as one compact JSON document:
+        group -> members, user -> groups, the distinct user count and the per department roll-up
+        '''
+        index = self.membership_index
+        titles = [project.group_title for project in self.active_metis_projects]
+
+        groups = {title: [username for username in index.members(title) or () if username] for title in titles}
+        users = {}
+        for title, members in groups.items():
+            for username in members:
+                users.setdefault(username, {})[title] = None
+
+        memberships = {
+            "schema_version": JSON_SCHEMA_VERSION,
+            "distinct_users": len(users),
+            "groups": groups,
+            "users": {username: list(user_groups) for username, user_groups in users.items()},
+            "departments": index.department_rollup(self.active_metis_projects)
+        }
+        self.write_output(filename, json.dumps(memberships, separators=(",", ":")) + "\n")
+
+    @instrumented_stage
     def update_project_descriptions(self)->None:
         '''
-        Iterate through active_metis_projects, and update all projects with their most recent description
+        Iterate through active_metis_projects, and update all projects with their most recent description
+        '''
+        for group in self.active_metis_projects:
+            group_title = str(group.group_title).upper()
+
+            if group_title in self.updated_project_descriptions:
+                group.description = self.updated_project_descriptions[group_title]
+                self.count("matches")
+
+    def render_html_header(self, project_count, label=None)->str:
+        '''
+        Return the html opening a project page, label names the shard the page shows
+        '''
+        shard_header = ""
+        if label is not None:
+            shard_header = f"""
+                    <h2 class="header-text">{ label }</h2>"""
+
+        return f"""
+                <div class="top-text">
+                    <h1 class="header-text">CRCD Supported Research Projects</h1>
+                    <h2 class="header-text">Total Number of Active Research Projects: {project_count}</h2>{shard_header}
+                </div>   
+                <div class="inner-body">               
+            """
+
+    def render_project_html(self, group)->str:
+        '''
+        Return the html card of a project
+        '''
+        # Capitalize first letter of group title
+        group_title = str(group.group_title).upper()
+
+        # Embed the project data within html
+        return f""" 
+                        <div class="project">
+                            <h2> { group_title } </h2> 
+                            <p>  { group.PI_name } ({ group.PI_department })</p>
+                            <p><i>{ group.description }</i></p>
+                            <p>  Group Members: { group.group_member_count } </p>
+                        </div>
+                    """
+
+    def write_html_page(self, filename, projects, project_count, label=None)->bool:
+        '''
+        Stream a page with the cards of projects to filename
+
+        project_count: The total number of active projects, shown in the header
+        label: Name of the shard the page shows, None for the full page
+
+        Returns True if the file was written
+        '''
+        def chunks():
+            yield self.render_html_header(project_count, label)
+            for group in projects:
+                yield self.render_project_html(group)
+            yield "</div>"
+
+        return self.write_output_chunks(filename, chunks())
+
+    def html_shards(self, projects, shard, page_size)->list:
+        '''
+        Split the projects into (key, label, projects) shards
+
+        shard: "department" for a page per department, or "pages" for pages of page_size projects
+        '''
+        if shard == "department":
+            by_department = {}
+            for group in projects:
+                by_department.setdefault(group.PI_department.strip() or "Other", []).append(group)
+
+            # Departments differing only in case or punctuation share a slug, the later ones get a suffix
+            shards = []
+            keys = set()
+            for department in sorted(by_department):
+                slug = re.sub(r"[^a-z0-9]+", "_", department.lower()).strip("_") or "other"
+                key, number = slug, 1
+                while key in keys:
+                    number += 1
+                    key = f"{slug}_{number}"
+                keys.add(key)
+                shards.append((key, department, by_department[department]))
+            return shards
+
+        page_size = max(page_size, 1)
+        return [
+            (f"page{number}", f"Page {number}", projects[offset:offset + page_size])
+            for number, offset in enumerate(range(0, len(projects), page_size), start=1)
+        ]
+
+    def write_html_index(self, filename, shards, project_count)->bool:
+        '''
+        Write the page linking to every shard, with the number of projects in each
+
+        shards: List of (shard filename, label, projects)
+        '''
+        links = "".join(
+            f"""
+                    <li><a href="{ os.path.basename(shard_filename) }">{ label }</a> ({ len(projects) })</li>"""
+            for shard_filename, label, projects in shards
+        )
+        return self.write_output_chunks(filename, [
+            self.render_html_header(project_count),
+            f"""
+                <ul class="project-index">{links}
+                </ul>
+            """,
+            "</div>"
+        ])
+
+    def replace_file(self, filename, chunks)->None:
+        '''
+        Atomically replace filename with chunks of bytes, through a temp file in the same directory
+        '''
+        directory = os.path.dirname(os.path.abspath(filename))
+        file = tempfile.NamedTemporaryFile(mode="wb", dir=directory, delete=False)
+        try:
+            with file:
+                for chunk in chunks:
+                    file.write(chunk)
+            os.chmod(file.name, 0o644)
+            os.replace(file.name, filename)
+        finally:
+            if os.path.exists(file.name):
+                os.remove(file.name)
+
+    @staticmethod
+    def file_blocks(filename, block_size=1 << 16):
+        '''
+        Yield the content of filename in blocks of bytes
+        '''
+        with open(filename, "rb") as file:
+            yield from iter(functools.partial(file.read, block_size), b"")
+
+    @staticmethod
+    def gzip_blocks(blocks):
+        '''
+        Yield blocks compressed as one gzip member, with mtime=0 so identical content gives an identical file
+        '''
+        buffer = io.BytesIO()
+        with gzip.GzipFile(filename="", mode="wb", compresslevel=9, fileobj=buffer, mtime=0) as compressed:
+            for block in blocks:
+                compressed.write(block)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    @staticmethod
+    def brotli_blocks(blocks):
+        '''
+        Yield blocks compressed with brotli
+        '''
+        compressor = brotli.Compressor()
+        for block in blocks:
+            yield compressor.process(block)
+        yield compressor.finish()
+
+    @instrumented_stage
+    def publish(self, filename, directory=None)->bool:
+        '''
+        Publish filename to the public directory, with precompressed .gz (and .br if brotli is installed)
+        siblings and a .etag sidecar holding the sha256 of the content.
+        Every file is streamed and replaced atomically, the sidecar last, and nothing is written
+        when the published ETag already matches the content.
+
+        filename: The file to publish
+        directory: Directory to publish to, public_html_dir by default
+
+        Returns True if the file was published
+        Raises OSError if the file could not be published
         '''
-        for group in self.active_metis_projects:
-            group_title = str(group["group_title"]).upper()
+        if directory is None:
+            directory = self.public_html_dir if self.public_html_dir is not None else PUBLIC_HTML_DIR
 
-            if group_title in self.updated_project_descriptions:
-                group["description"] = self.updated_project_descriptions[group_title]
+        digest = hashlib.sha256()
+        size = 0
+        for block in self.file_blocks(filename):
+            digest.update(block)
+            size += len(block)
+        self.count("bytes_read", size)
+
+        etag = digest.hexdigest()
+        target = os.path.join(directory, os.path.basename(filename))
+        etag_file = target + PUBLISH_ETAG_EXTENSION
+
+        # Skip unchanged content
+        try:
+            with open(etag_file, "r") as file:
+                if file.read().strip() == etag and os.path.exists(target):
+                    return False
+        except FileNotFoundError:
+            pass
+
+        self.replace_file(target + ".gz", self.gzip_blocks(self.file_blocks(filename)))
+        if brotli is not None:
+            self.replace_file(target + ".br", self.brotli_blocks(self.file_blocks(filename)))
+        self.replace_file(target, self.file_blocks(filename))
+        self.replace_file(etag_file, [(etag + "\n").encode()])
 
-    def write_web_metis_project_data(self, filename="web_project_html.txt")->None:
+        self.written_outputs.append(target)
+        self.count("bytes_written", size)
+        return True
+
+    @instrumented_stage
+    def write_web_metis_project_data(self, filename="web_project_html.txt", shard=None, page_size=50)->None:
         '''
         write_web_metis_project_data: Iterate through the project data and format as html data
-        ''' 
-        with open(filename, "w") as file:
-            
-            file.write(f"""
-                <div class="top-text">
-                    <h1 class="header-text">CRCD Supported Research Projects</h1>
-                    <h2 class="header-text">Total Number of Active Research Projects: {self.valid_project_count()}</h2>
-                </div>   
-                <div class="inner-body">               
-            """)
-            
-            for group in self.active_metis_projects:
-                
-                if group['PI_name'] is None or \
-                   group['PI_department'] is None or \
-                    group['PI_department'] == "" or \
-                   group["group_member_count"] is None or \
-                   group['description'] == "No description found" or \
-                   group["group_title"] in self.archived_metis_projects:
-                    continue
-                
-                else:    
-                    # Capitalize first letter of group title
-                    group_title = str(group['group_title']).upper()
-                    
-                    # Embed the project data within html
-                    group_as_html = f""" 
-                        <div class="project">
-                            <h2> { group_title } </h2> 
-                            <p>  { group['PI_name'] } ({ group['PI_department'] })</p>
-                            <p><i>{ group['description'] }</i></p>
-                            <p>  Group Members: { group['group_member_count'] } </p>
-                        </div>
-                    """
-                    # Write the html formatted data
-                    file.write(group_as_html)
+
+        filename: The page with every project
+        shard: Also write a page per "department", or "pages" of page_size projects,
+               to <name>_<shard>.txt next to filename and an index page to <name>_index.txt
+        '''
+        projects = self.visible_projects()
+        project_count = len(projects)
+
+        # Publish the formatted html to the public directory when it changed
+        self.write_html_page(filename, projects, project_count)
+        self.publish(filename)
+
+        if shard is None:
+            return
+
+        base, extension = os.path.splitext(filename)
+        shards = []
+        for key, label, shard_projects in self.html_shards(projects, shard, page_size):
+            shard_filename = f"{base}_{key}{extension}"
+            self.write_html_page(shard_filename, shard_projects, project_count, label)
+            self.publish(shard_filename)
+            shards.append((shard_filename, label, shard_projects))
+
+        index_filename = f"{base}_index{extension}"
+        self.write_html_index(index_filename, shards, project_count)
+        self.publish(index_filename)
+
+    @instrumented_stage
+    def write_search_index(self, filename="./web_project_search.json")->None:
+        '''
+        Write the ProjectSearchIndex of the projects on the web page as compact JSON,
+        and publish it next to the html when it changed
+        '''
+        index = ProjectSearchIndex.build(self.visible_projects())
+        self.count("rows_parsed", len(index.documents))
+        self.count("lookups", len(index.tokens))
+
+        self.write_output(filename, json.dumps(index.as_dict(), separators=(",", ":")) + "\n")
+        self.publish(filename)
+
+    def input_fingerprints(self)->dict:
+        '''
+        Return the sha256 of every input file, keyed by path
+        '''
+        input_files = [
+            PROJECT_DESCRIPTION_FILE,
+            PROJECT_GROUPS_FILE,
+            self.metis_users_csv,
+            self.metis_pis_csv,
+            self.metis_pi_lastlog_csv
+        ]
+        return {filename: file_fingerprint(filename) for filename in input_files}
+
+    @instrumented_stage
+    def write_catalog(self, filename)->int:
+        '''
+        Store this run as a new snapshot in the SQLite catalog filename
+        
+        Returns the run_id of the snapshot
+        '''
+        catalog = ProjectCatalog(filename)
+        try:
+            return catalog.record_run(self, self.input_fingerprints())
+        finally:
+            catalog.close()
+
+    def run_state(self, options)->dict:
+        '''
+        Return the state an incremental run compares with the previous one: the sha256 of this script
+        and the JSON schema version, the options changing the outputs and the input fingerprints
+
+        options: The options changing the outputs, keyed by name, see OPTION_STAGES
+        '''
+        return {
+            "code": file_fingerprint(os.path.abspath(__file__)),
+            "schema_version": JSON_SCHEMA_VERSION,
+            "options": options,
+            "fingerprints": self.input_fingerprints()
+        }
+
+    def outdated_stages(self, pipeline, previous_state, state)->list:
+        '''
+        Return the stages of pipeline whose outputs are out of date, in stage order: every stage when the code,
+        the schema or the previous state is unknown, or an output file is missing, otherwise the stages downstream
+        of the inputs whose fingerprint changed and of the options that changed
+
+        previous_state, state: The run_state of the previous run (empty if there is none) and of this run
+        '''
+        if any(previous_state.get(key) != state[key] for key in ("code", "schema_version")) or \
+                not all(os.path.exists(output) for output in OUTPUT_FILES):
+            return pipeline.select()
+
+        previous_fingerprints = previous_state.get("fingerprints", {})
+        changed = [filename for filename, fingerprint in state["fingerprints"].items() if previous_fingerprints.get(filename) != fingerprint]
+        outdated = set(pipeline.downstream(changed))
+
+        previous_options = previous_state.get("options", {})
+        for option, value in state["options"].items():
+            if previous_options.get(option) != value and OPTION_STAGES[option] in pipeline.stages:
+                outdated.add(OPTION_STAGES[option])
+
+        return [name for name in pipeline.stages if name in outdated]
+
+    @instrumented_stage
+    def load_state(self, filename=STATE_FILE)->dict:
+        '''
+        Return the run_state saved by the previous run, empty if there is none.
+        The groups file is parsed while it is queried, and the accounting CSVs come from the accounting cache,
+        so the fingerprints and the options are all the state an incremental run needs.
         
-            file.write("</div>")
-        # Copy the formatted html to the public directory
-        copy_html_to_public = subprocess.run(
-            ["cp", "./web_project_html.txt", "/var/www/html/pub/metis_projects"]
-        )   
+        filename: The state file to read
+        '''
+        try:
+            with open(filename, "r") as file:
+                state = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+        return state if isinstance(state, dict) else {}
+
+    @instrumented_stage
+    def save_state(self, state, filename=STATE_FILE)->None:
+        '''
+        Persist the run_state for the next incremental run
+        
+        state: The run_state this run was built from
+        filename: The state file to write
+        '''
+        with open(filename, "w") as file:
+            json.dump(state, file)
                                      
-def main():
+class ProjectCatalog:
+    '''
+    SQLite catalog of the Metis projects, with one snapshot per run.
+    Every table is keyed by run_id, the latest_* views show the newest snapshot.
+    '''
+
+    # Raised when the tables change, stored in PRAGMA user_version
+    SCHEMA_VERSION = 1
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created TEXT NOT NULL,
+            fingerprints TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS projects (
+            run_id INTEGER NOT NULL REFERENCES runs(run_id),
+            group_title TEXT NOT NULL,
+            pi TEXT NOT NULL,
+            pi_name TEXT,
+            pi_department TEXT,
+            pi_email TEXT,
+            description TEXT,
+            group_member_count INTEGER,
+            pi_last_login TEXT,
+            PRIMARY KEY (run_id, group_title)
+        );
+        CREATE TABLE IF NOT EXISTS members (
+            run_id INTEGER NOT NULL REFERENCES runs(run_id),
+            group_title TEXT NOT NULL,
+            username TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS pi_descriptions (
+            run_id INTEGER NOT NULL REFERENCES runs(run_id),
+            pi TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            description TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS archived_projects (
+            run_id INTEGER NOT NULL REFERENCES runs(run_id),
+            group_title TEXT NOT NULL,
+            pi TEXT,
+            group_member_count INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS projects_pi ON projects (run_id, pi);
+        CREATE INDEX IF NOT EXISTS projects_department ON projects (run_id, pi_department);
+        CREATE INDEX IF NOT EXISTS projects_group_title ON projects (group_title, run_id);
+        CREATE INDEX IF NOT EXISTS members_username ON members (run_id, username);
+        CREATE INDEX IF NOT EXISTS members_group_title ON members (run_id, group_title);
+        CREATE INDEX IF NOT EXISTS pi_descriptions_pi ON pi_descriptions (run_id, pi);
+        CREATE VIEW IF NOT EXISTS latest_projects AS
+            SELECT * FROM projects WHERE run_id = (SELECT MAX(run_id) FROM runs);
+        CREATE VIEW IF NOT EXISTS latest_members AS
+            SELECT * FROM members WHERE run_id = (SELECT MAX(run_id) FROM runs);
+    '''
+
+    def __init__(self, filename):
+        '''
+        Constructor for ProjectCatalog, creates the tables if they do not exist
+
+        filename: The SQLite database file
+        '''
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, self.SCHEMA_VERSION):
+            raise RuntimeError(f"{filename} has catalog schema version {version}, expected {self.SCHEMA_VERSION}")
+
+        with self.connection:
+            self.connection.executescript(self.SCHEMA)
+            self.connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def close(self)->None:
+        '''
+        Close the database connection
+        '''
+        self.connection.close()
+
+    def record_run(self, metis_projects, fingerprints=None)->int:
+        '''
+        Store the projects, members, PI descriptions and archived projects
+        of metis_projects as a new snapshot, in a single transaction
+
+        fingerprints: The input fingerprints the run was built from
+        
+        Returns the run_id of the snapshot
+        '''
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (created, fingerprints) VALUES (?, ?)",
+                (datetime.datetime.now().isoformat(timespec="seconds"), json.dumps(fingerprints or {}, sort_keys=True))
+            )
+            run_id = cursor.lastrowid
+
+            self.connection.executemany(
+                "INSERT INTO projects VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (run_id, project.group_title, project.PI, project.PI_name, project.PI_department, project.PI_email,
+                     project.description, project.group_member_count, project.pi_last_login)
+                    for project in metis_projects.active_metis_projects
+                )
+            )
+            self.connection.executemany(
+                "INSERT INTO members VALUES (?, ?, ?)",
+                (
+                    (run_id, project.group_title, username)
+                    for project in metis_projects.active_metis_projects
+                    for username in project.members or ()
+                    if username
+                )
+            )
+            self.connection.executemany(
+                "INSERT INTO pi_descriptions VALUES (?, ?, ?, ?)",
+                (
+                    (run_id, pi, position, description)
+                    for pi, descriptions in metis_projects.pi_and_project_descriptions.items()
+                    for position, description in enumerate(descriptions)
+                )
+            )
+            self.connection.executemany(
+                "INSERT INTO archived_projects VALUES (?, ?, ?, ?)",
+                (
+                    (run_id, project.group_title, project.PI, project.group_member_count)
+                    if isinstance(project, ProjectRecord) else (run_id, project, None, None)
+                    for project in metis_projects.archived_metis_projects
+                )
+            )
+
+        return run_id
+
+    def latest_run(self):
+        '''
+        Return the run_id of the newest snapshot, or None if the catalog is empty
+        '''
+        return self.connection.execute("SELECT MAX(run_id) FROM runs").fetchone()[0]
+
+    def projects_in_department(self, department, run_id=None)->list:
+        '''
+        Return the group titles of the projects whose PI is in department
+        '''
+        run_id = run_id or self.latest_run()
+        rows = self.connection.execute(
+            "SELECT group_title FROM projects WHERE run_id = ? AND pi_department = ? ORDER BY group_title",
+            (run_id, department)
+        )
+        return [row[0] for row in rows]
+
+    def projects_of_pi(self, pi, run_id=None)->list:
+        '''
+        Return the group titles of the projects owned by pi
+        '''
+        run_id = run_id or self.latest_run()
+        rows = self.connection.execute(
+            "SELECT group_title FROM projects WHERE run_id = ? AND pi = ? ORDER BY group_title",
+            (run_id, pi)
+        )
+        return [row[0] for row in rows]
+
+    def groups_of_member(self, username, run_id=None)->list:
+        '''
+        Return the group titles username is a member of
+        '''
+        run_id = run_id or self.latest_run()
+        rows = self.connection.execute(
+            "SELECT group_title FROM members WHERE run_id = ? AND username = ? ORDER BY group_title",
+            (run_id, username)
+        )
+        return [row[0] for row in rows]
+
+    def compare_runs(self, old_run_id, new_run_id)->dict:
+        '''
+        Return the group titles added, removed and changed between two snapshots
+        '''
+        columns = "pi, pi_name, pi_department, pi_email, description, group_member_count, pi_last_login"
+        added = self.connection.execute(
+            "SELECT group_title FROM projects WHERE run_id = ? "
+            "EXCEPT SELECT group_title FROM projects WHERE run_id = ? ORDER BY 1",
+            (new_run_id, old_run_id)
+        ).fetchall()
+        removed = self.connection.execute(
+            "SELECT group_title FROM projects WHERE run_id = ? "
+            "EXCEPT SELECT group_title FROM projects WHERE run_id = ? ORDER BY 1",
+            (old_run_id, new_run_id)
+        ).fetchall()
+        changed = self.connection.execute(
+            f"SELECT new.group_title FROM projects AS new JOIN projects AS old "
+            f"ON old.group_title = new.group_title AND old.run_id = ? "
+            f"WHERE new.run_id = ? AND ({', '.join('old.' + c for c in columns.split(', '))}) "
+            f"IS NOT ({', '.join('new.' + c for c in columns.split(', '))}) ORDER BY 1",
+            (old_run_id, new_run_id)
+        ).fetchall()
+        return {
+            "added": [row[0] for row in added],
+            "removed": [row[0] for row in removed],
+            "changed": [row[0] for row in changed]
+        }
+
+class ProjectSnapshot:
+    '''
+    Enriched MetisProjects built from the input files, with lookup indexes for the JSON API.
+    A snapshot is never changed once built, the server swaps in a new one on every rebuild.
+    '''
+
+    def __init__(self, metis_projects, signatures):
+        '''
+        Constructor for ProjectSnapshot
+
+        metis_projects: The enriched MetisProjects
+        signatures: The (mtime, size) of every input file it was built from
+        '''
+        self.metis_projects = metis_projects
+        self.signatures = signatures
+        self.built = datetime.datetime.now().isoformat(timespec="seconds")
+
+        self.projects = {project.group_title: project.as_dict() for project in metis_projects.active_metis_projects}
+        self.visible = {project.group_title for project in metis_projects.visible_projects()}
+        self.search_index = ProjectSearchIndex.build(metis_projects.visible_projects())
+
+        self.by_department = {}
+        for project in metis_projects.active_metis_projects:
+            if project.PI_department is not None:
+                self.by_department.setdefault(project.PI_department.strip(), []).append(project.group_title)
+
+        # Only the groups that are active projects
+        index = metis_projects.membership_index
+        self.by_member = {}
+        for username, groups in index.groups_by_member.items():
+            titles = [group for group in groups if group in self.projects]
+            if titles:
+                self.by_member[username] = titles
+
+    def projects_for(self, titles)->list:
+        '''
+        Return the project dictionaries of titles
+        '''
+        return [self.projects[title] for title in titles]
+
+    def counts(self)->dict:
+        '''
+        Return the number of projects, PIs, members and projects per department
+        '''
+        return {
+            "built": self.built,
+            "projects": len(self.projects),
+            "visible_projects": len(self.visible),
+            "pis": len(self.metis_projects.active_metis_projects.projects_by_pi),
+            "members": len(self.by_member),
+            "departments": {department: len(titles) for department, titles in sorted(self.by_department.items())}
+        }
+
+class ProjectServer:
+    '''
+    Keeps the enriched projects in memory and serves them as a local JSON API.
+    The input files are polled for changes (mtime and size), and the projects are rebuilt
+    reusing the parsed state of every input that did not change.
+
+    GET /projects                   : Every active project, ?visible=1 for the projects on the web page
+    GET /projects/<group title>     : One project
+    GET /pis/<pi>                   : The projects of a PI
+    GET /departments/<department>   : The projects of a department
+    GET /members/<username>         : The projects a user is a member of
+    GET /counts                     : Number of projects, PIs, members and projects per department
+    GET /search?q=<words>           : The projects on the web page matching every word as a prefix,
+                                      with their number per department, &department= to filter
+    '''
+
+    def __init__(self, metis_users_csv=METIS_USERS_CSV, metis_pis_csv=METIS_PIS_CSV, metis_pi_lastlog_csv=METIS_PI_LASTLOG_CSV,
+                 description_file=PROJECT_DESCRIPTION_FILE, groups_file=PROJECT_GROUPS_FILE, poll_interval=SERVE_POLL_INTERVAL,
+                 accounting_cache=None):
+        '''
+        Constructor for ProjectServer
+
+        metis_users_csv: Accounting export of all Metis users
+        metis_pis_csv: Accounting export of all Metis PIs
+        metis_pi_lastlog_csv: Accounting export of the PIs last logins
+        description_file: The project descriptions written by the LDAP query
+        groups_file: The groups file written by the groups query
+        poll_interval: Seconds between checks of the input files
+        accounting_cache: AccountingCache the accounting exports are loaded through on every rebuild
+        '''
+        self.metis_users_csv = metis_users_csv
+        self.metis_pis_csv = metis_pis_csv
+        self.metis_pi_lastlog_csv = metis_pi_lastlog_csv
+        self.description_file = description_file
+        self.groups_file = groups_file
+        self.poll_interval = poll_interval
+        self.accounting_cache = accounting_cache
+
+        self.snapshot = None
+        self.stopped = threading.Event()
+        self.httpd = None
+
+    def input_signatures(self)->dict:
+        '''
+        Return the (mtime, size) of every input file, or None for a missing file
+        '''
+        signatures = {}
+        for filename in (self.description_file, self.groups_file, self.metis_users_csv, self.metis_pis_csv, self.metis_pi_lastlog_csv):
+            try:
+                status = os.stat(filename)
+                signatures[filename] = (status.st_mtime_ns, status.st_size)
+            except FileNotFoundError:
+                signatures[filename] = None
+        return signatures
+
+    def build(self, signatures)->ProjectSnapshot:
+        '''
+        Build a snapshot from the input files, reusing the parsed state
+        of the previous snapshot for the inputs that did not change
+        '''
+        metis_projects = MetisProjects(self.metis_users_csv, self.metis_pis_csv, self.metis_pi_lastlog_csv, self.accounting_cache)
+
+        previous = self.snapshot
+        if previous is not None:
+            unchanged = {filename for filename, signature in signatures.items() if previous.signatures.get(filename) == signature}
+            previous_projects = previous.metis_projects
+
+            if self.groups_file in unchanged:
+                metis_projects.disabled_pis = previous_projects.disabled_pis
+                metis_projects.ids_by_email = previous_projects.ids_by_email
+                metis_projects.extracted_project_data = previous_projects.extracted_project_data
+                metis_projects.membership_index = previous_projects.membership_index
+                metis_projects.project_groups_source = previous_projects.project_groups_source
+
+            if self.description_file in unchanged:
+                metis_projects.description_by_pi = previous_projects.description_by_pi
+                metis_projects.consecutive_pi_lines = previous_projects.consecutive_pi_lines
+                metis_projects.project_descriptions_by_pi = previous_projects.project_descriptions_by_pi
+                metis_projects.project_descriptions_source = previous_projects.project_descriptions_source
+
+            if self.metis_pi_lastlog_csv in unchanged and self.metis_pi_lastlog_csv in previous_projects.last_login_indexes:
+                metis_projects.last_login_indexes[self.metis_pi_lastlog_csv] = previous_projects.last_login_indexes[self.metis_pi_lastlog_csv]
+
+        # The stages of fetch_active_metis_projects, without writing any file
+        metis_projects.load_project_groups(self.groups_file)
+        metis_projects.active_pis = [value for key, value in metis_projects.extracted_project_data.items() if key.endswith("-pi")]
+        metis_projects.assign_project_data(metis_projects.extracted_project_data)
+        metis_projects.assign_pi_name_and_department()
+        metis_projects.load_project_descriptions(self.description_file)
+        metis_projects.assign_project_descriptions(self.description_file)
+        metis_projects.pis_and_projects(self.description_file)
+        metis_projects.pis_missing_description_helper(self.description_file)
+        metis_projects.resolve_pi_department_discrepancy()
+        metis_projects.assign_pi_last_log()
+        metis_projects.update_project_descriptions()
+
+        return ProjectSnapshot(metis_projects, signatures)
+
+    def refresh(self)->bool:
+        '''
+        Rebuild the snapshot if an input file changed
+
+        Returns True if the snapshot was rebuilt
+        '''
+        signatures = self.input_signatures()
+        if self.snapshot is not None and signatures == self.snapshot.signatures:
+            return False
+
+        self.snapshot = self.build(signatures)
+        return True
+
+    def poll(self)->None:
+        '''
+        Refresh the snapshot every poll_interval seconds until the server stops
+        '''
+        while not self.stopped.wait(self.poll_interval):
+            try:
+                if self.refresh():
+                    print(f"Rebuilt Metis projects at {self.snapshot.built}")
+            except Exception as error:
+                # Keep serving the last good snapshot, e.g. while an input is being rewritten,
+                # a half written export can fail in the csv module or any lookup
+                print(f"Could not rebuild Metis projects: {type(error).__name__}: {error}", file=sys.stderr)
+
+    def handle(self, path)->tuple:
+        '''
+        Answer a GET request for path
+
+        Returns the HTTP status and the JSON serializable response
+        '''
+        snapshot = self.snapshot
+        url = urllib.parse.urlsplit(path)
+        parts = [urllib.parse.unquote(part) for part in url.path.split("/") if part]
+        query = urllib.parse.parse_qs(url.query)
+
+        if parts == ["projects"]:
+            titles = snapshot.projects
+            if query.get("visible", ["0"])[0] not in ("0", "false", ""):
+                titles = [title for title in titles if title in snapshot.visible]
+            return 200, snapshot.projects_for(titles)
+        if parts == ["counts"]:
+            return 200, snapshot.counts()
+        if parts == ["search"]:
+            index = snapshot.search_index
+            matches = index.search(query.get("q", [""])[0], query.get("department", [None])[0])
+            return 200, {
+                "facets": {"department": index.facets(matches)},
+                "projects": snapshot.projects_for(index.documents[number][0] for number in matches)
+            }
+        if len(parts) == 2:
+            kind, key = parts
+            if kind == "projects" and key in snapshot.projects:
+                return 200, snapshot.projects[key]
+            if kind == "pis":
+                return 200, [project.as_dict() for project in snapshot.metis_projects.active_metis_projects.by_pi(key)]
+            if kind == "departments":
+                return 200, snapshot.projects_for(snapshot.by_department.get(key, []))
+            if kind == "members":
+                return 200, snapshot.projects_for(snapshot.by_member.get(key, []))
+
+        return 404, {"error": f"Not found: {url.path}"}
+
+    def make_handler(self):
+        '''
+        Return the request handler class answering with this server
+        '''
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                status, response = server.handle(self.path)
+                body = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self, host=SERVE_HOST, port=SERVE_PORT)->tuple:
+        '''
+        Build the first snapshot, and start serving and polling in background threads
+
+        Returns the (host, port) the server listens on, port 0 picks a free port
+        '''
+        self.refresh()
+        self.httpd = ThreadingHTTPServer((host, port), self.make_handler())
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        threading.Thread(target=self.poll, daemon=True).start()
+        return self.httpd.server_address[:2]
+
+    def stop(self)->None:
+        '''
+        Stop serving and polling
+        '''
+        self.stopped.set()
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+def main(argv=None):
     '''
     main: A script to get the active projects on Metis
     '''
+    parser = argparse.ArgumentParser(description="Get the active projects on Metis")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Skip the run when no input changed since the last run"
+    )
+    parser.add_argument(
+        "--state-file", default=STATE_FILE,
+        help="File the input fingerprints of incremental runs are kept in (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--ldap-max-age", type=float, default=0,
+        help="With --incremental, reuse the project description dump if it is younger than this many hours"
+    )
+    parser.add_argument(
+        "--query-timeout", type=float, default=QUERY_TIMEOUT,
+        help="Seconds each source query may run before it is killed (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--accounting-cache", default=ACCOUNTING_CACHE_DIR,
+        help="Directory the parsed accounting CSVs are cached in (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--no-accounting-cache", action="store_true",
+        help="Parse the accounting CSVs on every run, without the cache"
+    )
+    parser.add_argument(
+        "--html-shard", choices=["department", "pages"],
+        help="Also write the html split into a page per department, or pages of --html-page-size projects, with an index page"
+    )
+    parser.add_argument(
+        "--html-page-size", type=int, default=50,
+        help="Projects per page with --html-shard pages (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--target", action="append",
+        help="Only run this pipeline stage and the stages it depends on, from the files the last run queried "
+             "(e.g. html), can be repeated"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=PIPELINE_WORKERS,
+        help="Pipeline stages run at the same time (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--catalog",
+        help="Also store this run as a snapshot in this SQLite catalog"
+    )
+    parser.add_argument(
+        "--metrics-json",
+        help="Write the time and counters of every stage as JSON to this file"
+    )
+    parser.add_argument(
+        "--metrics-prom",
+        help="Write the time and counters of every stage to this Prometheus textfile collector file"
+    )
+    parser.add_argument(
+        "--profile",
+        help="Run every stage under cProfile and dump its stats to <stage>.prof files in this directory"
+    )
+    parser.add_argument(
+        "--snapshot",
+        help="After the run, store every input it read (description dump, groups file, accounting CSVs) in this archive"
+    )
+    parser.add_argument(
+        "--replay",
+        help="Run the pipeline on the inputs of this --snapshot archive instead of querying the sources"
+    )
+    parser.add_argument(
+        "--replay-dir",
+        help="Directory --replay extracts the inputs to and writes the outputs in (default: replay_<archive name>)"
+    )
+    parser.add_argument(
+        "--batch",
+        help="Update every cluster of this JSON config, each in its own directory and worker process"
+    )
+    parser.add_argument(
+        "--batch-workers", type=int,
+        help="Worker processes for --batch (default: one per cluster)"
+    )
+    parser.add_argument(
+        "--serve", action="store_true",
+        help="Keep the projects in memory, rebuild them when the input files change, and serve them as a local JSON API"
+    )
+    parser.add_argument("--host", default=SERVE_HOST, help="Address --serve listens on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=SERVE_PORT, help="Port --serve listens on (default: %(default)s)")
+    parser.add_argument(
+        "--poll-interval", type=float, default=SERVE_POLL_INTERVAL,
+        help="Seconds between checks of the input files with --serve (default: %(default)s)"
+    )
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve_metis_projects(args)
+        return
+
+    if args.batch:
+        # The clusters run in worker processes, which do not collect metrics or snapshots
+        for option in ("metrics_json", "metrics_prom", "profile", "snapshot", "replay"):
+            if getattr(args, option):
+                parser.error(f"--{option.replace('_', '-')} cannot be combined with --batch")
+        try:
+            if not batch_metis_projects(args):
+                sys.exit(1)
+        except (OSError, ValueError) as error:
+            parser.error(str(error))
+        return
+
+    # Files named on the command line stay relative to where the script was started
+    for option in ("snapshot", "metrics_json", "metrics_prom", "profile", "catalog", "state_file", "accounting_cache"):
+        if getattr(args, option):
+            setattr(args, option, os.path.abspath(getattr(args, option)))
+
+    cluster = ClusterConfig("metis")
+    if args.replay:
+        replay_dir = args.replay_dir or "replay_" + os.path.splitext(os.path.basename(args.replay))[0]
+        try:
+            cluster = extract_snapshot(args.replay, os.path.abspath(replay_dir))
+        except (OSError, ValueError, zipfile.BadZipFile) as error:
+            parser.error(str(error))
+        os.chdir(cluster.directory)
 
     print("Getting Metis Projects")
-    metis_projects = MetisProjects()
-    
+    metis_projects = MetisProjects(
+        cluster.metis_users_csv, cluster.metis_pis_csv, cluster.metis_pi_lastlog_csv,
+        accounting_cache=accounting_cache_from_args(args), public_html_dir=cluster.public_html_dir
+    )
+
+    if args.target:
+        try:
+            metis_projects.pipeline(catalog=args.catalog).select(args.target)
+        except ValueError as error:
+            parser.error(str(error))
+
+    # Instrumentation is only enabled when its output was asked for
+    if args.metrics_json or args.metrics_prom or args.profile:
+        metis_projects.metrics = StageMetrics(profile=bool(args.profile))
+
+    try:
+        if args.replay:
+            replay_metis_projects(metis_projects, args)
+        else:
+            update_metis_projects(metis_projects, args)
+
+        if args.snapshot:
+            write_snapshot(args.snapshot, metis_projects)
+            print(f"Stored the inputs in {args.snapshot}")
+    finally:
+        if metis_projects.metrics is not None:
+            if args.metrics_json:
+                metis_projects.metrics.write_json(args.metrics_json)
+            if args.metrics_prom:
+                metis_projects.metrics.write_prometheus(args.metrics_prom)
+            if args.profile:
+                metis_projects.metrics.write_profiles(args.profile)
+
+def accounting_cache_from_args(args):
+    '''
+    Return the AccountingCache asked for on the command line, or None
+    '''
+    if args.no_accounting_cache:
+        return None
+    return AccountingCache(args.accounting_cache)
+
+class MappedArchive(mmap.mmap):
+    '''
+    Read only memory map of a --snapshot archive, that zipfile can read members from
+    '''
+
+    def seekable(self)->bool:
+        '''
+        zipfile seeks to the members listed in the central directory, mmap only has seekable() from Python 3.13
+        '''
+        return True
+
+def snapshot_members(metis_projects)->dict:
+    '''
+    Return the archive member name -> path of every input of metis_projects,
+    the description dump members are optional
+    '''
+    return {
+        "metis_project_description.ldif": PROJECT_DESCRIPTION_LDIF,
+        "metis_project_description.txt": PROJECT_DESCRIPTION_FILE,
+        "metis_project_groups.txt": PROJECT_GROUPS_FILE,
+        "metis_users.csv": metis_projects.metis_users_csv,
+        "metis_pis.csv": metis_projects.metis_pis_csv,
+        "metis_pi_lastlog.csv": metis_projects.metis_pi_lastlog_csv
+    }
+
+def write_snapshot(filename, metis_projects)->dict:
+    '''
+    Store every input metis_projects read in one compressed zip archive, with a manifest.json member
+    holding the layout version and the source path, size and sha256 of every input.
+    The zip central directory indexes the members, so a replay reads them from the memory mapped archive.
+
+    Returns the manifest
+    Raises OSError if a required input is missing
+    '''
+    manifest = {
+        "schema_version": SNAPSHOT_VERSION,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "members": {}
+    }
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".zip", delete=False) as file:
+        try:
+            with zipfile.ZipFile(file, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=9) as archive:
+                for name, path in snapshot_members(metis_projects).items():
+                    if name.startswith("metis_project_description") and not os.path.exists(path):
+                        continue
+                    archive.write(path, name)
+                    manifest["members"][name] = {
+                        "source": os.path.abspath(path),
+                        "size": os.path.getsize(path),
+                        "sha256": file_fingerprint(path)
+                    }
+                archive.writestr(SNAPSHOT_MANIFEST, json.dumps(manifest, indent=2))
+        except BaseException:
+            os.remove(file.name)
+            raise
+
+    os.chmod(file.name, 0o644)
+    os.replace(file.name, filename)
+    return manifest
+
+def extract_snapshot(filename, directory)->ClusterConfig:
+    '''
+    Extract a --snapshot archive to directory, checking the sha256 of every input.
+    The description dump and groups file go to directory, where the pipeline reads them,
+    the accounting exports to directory/accounting, and the html is published to directory/public.
+
+    Returns the ClusterConfig of the extracted inputs
+    Raises ValueError if the archive is not a snapshot of this version or an input does not match its sha256
+    '''
+    accounting_directory = os.path.join(directory, "accounting")
+    public_directory = os.path.join(directory, "public")
+
+    with open(filename, "rb") as file:
+        if not zipfile.is_zipfile(file):
+            raise ValueError(f"{filename} is not a Metis projects snapshot")
+        mapped = MappedArchive(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    with mapped, zipfile.ZipFile(mapped) as archive:
+
+        try:
+            manifest = json.loads(archive.read(SNAPSHOT_MANIFEST))
+        except KeyError:
+            raise ValueError(f"{filename} is not a Metis projects snapshot")
+        if manifest.get("schema_version") != SNAPSHOT_VERSION:
+            raise ValueError(f"{filename} is a version {manifest.get('schema_version')} snapshot, expected {SNAPSHOT_VERSION}")
+
+        os.makedirs(accounting_directory, exist_ok=True)
+        os.makedirs(public_directory, exist_ok=True)
+
+        for name, member in manifest["members"].items():
+            if name != os.path.basename(name):
+                raise ValueError(f"{name} in {filename} is not an input file name")
+            target = os.path.join(accounting_directory if name.endswith(".csv") else directory, name)
+            digest = hashlib.sha256()
+            with archive.open(name) as source, open(target, "wb") as destination:
+                for block in iter(functools.partial(source.read, 1 << 20), b""):
+                    digest.update(block)
+                    destination.write(block)
+            if digest.hexdigest() != member["sha256"]:
+                raise ValueError(f"{name} in {filename} does not match its sha256")
+
+    return ClusterConfig(
+        os.path.splitext(os.path.basename(filename))[0], directory,
+        metis_users_csv=os.path.join(accounting_directory, "metis_users.csv"),
+        metis_pis_csv=os.path.join(accounting_directory, "metis_pis.csv"),
+        metis_pi_lastlog_csv=os.path.join(accounting_directory, "metis_pi_lastlog.csv"),
+        public_html_dir=public_directory
+    )
+
+def replay_metis_projects(metis_projects, args)->None:
+    '''
+    Run the pipeline on the inputs extracted from a --snapshot archive, in the current directory, without querying
+    '''
+    if os.path.exists(PROJECT_DESCRIPTION_LDIF):
+        metis_projects.write_project_description_file()
+
+    pipeline = metis_projects.pipeline(shard=args.html_shard, page_size=args.html_page_size, catalog=args.catalog)
+    stages = pipeline.run(metis_projects, args.target, args.workers)
+    print(f"Replayed {', '.join(stages)}, {len(metis_projects.written_outputs)} output files written")
+
+def load_batch_config(filename)->list:
+    '''
+    Read the clusters of a --batch JSON config, {"clusters": [{"name": ..., <ClusterConfig field>: ...}, ...]}.
+    Relative paths are relative to the config file, a cluster's directory defaults to its name.
+
+    Returns the ClusterConfigs
+    Raises ValueError if the config is not valid
+    '''
+    with open(filename, "r") as file:
+        config = json.load(file)
+
+    base = os.path.dirname(os.path.abspath(filename))
+    clusters = []
+    for entry in config.get("clusters", []):
+        unknown = set(entry) - set(ClusterConfig._fields)
+        if "name" not in entry or unknown:
+            raise ValueError(f"{filename}: every cluster needs a name and only {', '.join(ClusterConfig._fields)}")
+
+        entry = dict(entry)
+        entry.setdefault("directory", entry["name"])
+        for field in ("directory", "groups_source", "metis_users_csv", "metis_pis_csv", "metis_pi_lastlog_csv", "public_html_dir"):
+            if field in entry:
+                entry[field] = os.path.join(base, entry[field])
+        clusters.append(ClusterConfig(**entry))
+
+    names = [cluster.name for cluster in clusters]
+    if not clusters or len(set(names)) != len(names):
+        raise ValueError(f"{filename}: the clusters need distinct names")
+
+    # Clusters sharing a directory would overwrite each other's outputs
+    for field in ("directory", "public_html_dir"):
+        used_by = {}
+        for cluster in clusters:
+            path = os.path.normpath(getattr(cluster, field))
+            if path in used_by:
+                raise ValueError(f"{filename}: clusters {used_by[path]} and {cluster.name} have the same {field} {path}")
+            used_by[path] = cluster.name
+
+    return clusters
+
+# AccountingCache shared by the --batch workers, set by set_batch_accounting_cache
+batch_accounting_cache = None
+
+def set_batch_accounting_cache(accounting_cache)->None:
+    '''
+    Initializer of the --batch worker processes
+    '''
+    global batch_accounting_cache
+    batch_accounting_cache = accounting_cache
+
+def update_cluster(cluster, args)->int:
+    '''
+    Run the pipeline of one cluster in its directory, in a --batch worker process
+
+    Returns the number of output files written
+    '''
+    os.makedirs(cluster.directory, exist_ok=True)
+    os.chdir(cluster.directory)
+
+    metis_projects = MetisProjects(
+        cluster.metis_users_csv, cluster.metis_pis_csv, cluster.metis_pi_lastlog_csv,
+        accounting_cache=batch_accounting_cache, public_html_dir=cluster.public_html_dir
+    )
+    update_metis_projects(metis_projects, args, cluster)
+    return len(metis_projects.written_outputs)
+
+def batch_metis_projects(args)->bool:
+    '''
+    Update every cluster of the --batch config, each in a worker process.
+    The accounting exports used by several clusters (e.g. the campus wide users) are parsed once,
+    before the workers start, and shared with them through the AccountingCache.
+
+    Returns True if every cluster was updated
+    '''
+    clusters = load_batch_config(args.batch)
+
+    # Without the on-disk cache the tables are still shared, in memory
+    accounting_cache = accounting_cache_from_args(args) or AccountingCache(directory=None)
+
+    exports = {}
+    for cluster in clusters:
+        for filename, kind in ((cluster.metis_users_csv, "users"), (cluster.metis_pis_csv, "pis"), (cluster.metis_pi_lastlog_csv, "lastlog")):
+            exports.setdefault((os.path.abspath(filename), kind), []).append(cluster.name)
+    for (filename, kind), names in exports.items():
+        if len(names) > 1:
+            print(f"Parsing {filename} once for {', '.join(names)}")
+            accounting_cache.load(filename, kind)
+
+    # Forked workers share the parsed tables with this process until they change them
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    workers = min(args.batch_workers or len(clusters), len(clusters))
+
+    updated = True
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=set_batch_accounting_cache, initargs=(accounting_cache,)) as executor:
+        futures = {cluster.name: executor.submit(update_cluster, cluster, args) for cluster in clusters}
+        for name, future in futures.items():
+            try:
+                print(f"{name}: updated {future.result()} output files")
+            except Exception as error:
+                print(f"{name}: failed: {error}", file=sys.stderr)
+                updated = False
+
+    return updated
+
+def serve_metis_projects(args)->None:
+    '''
+    Serve the projects built from the files of the last run until interrupted
+    '''
+    server = ProjectServer(poll_interval=args.poll_interval, accounting_cache=accounting_cache_from_args(args))
+    host, port = server.start(args.host, args.port)
+    print(f"Serving Metis Projects on http://{host}:{port}")
+    try:
+        server.stopped.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+def update_metis_projects(metis_projects, args, cluster=None)->None:
+    '''
+    Query the sources and write every output file, for the arguments parsed by main()
+
+    cluster: ClusterConfig of the LDAP server and groups file to query, Metis by default
+    '''
+    if cluster is None:
+        cluster = ClusterConfig("metis")
+
+    pipeline = metis_projects.pipeline(shard=args.html_shard, page_size=args.html_page_size, catalog=args.catalog)
+
+    # Only run the targets, from the files the last run queried
+    if args.target:
+        stages = pipeline.run(metis_projects, args.target, args.workers)
+        print(f"Ran {', '.join(stages)}")
+        return
+
+    queries = []
+
     # Query idap for project descriptions
-    print("Getting Metis Project Descriptions")
-    query_projects = "ldapsearch -Z -x -H ldap://pldapms.hpc.cls | grep description"
-    metis_projects.query_and_write_file(query_projects, "metis_project_description.txt")
+    description_age = None
+    if os.path.exists(PROJECT_DESCRIPTION_LDIF) and os.path.exists(PROJECT_DESCRIPTION_FILE):
+        description_age = (datetime.datetime.now().timestamp() - os.path.getmtime(PROJECT_DESCRIPTION_LDIF)) / 3600
 
-    # Get all Metis groups
-    print("Getting Metis Project Groups")
-    metis_groups = "cat /home/admin/data/account_reports/aliases.ldap.Feb1_011701"
-    metis_projects.query_and_write_file(metis_groups, "metis_project_groups.txt")
+    query_descriptions = not (args.incremental and description_age is not None and description_age < args.ldap_max_age)
+    if query_descriptions:
+        print("Getting Metis Project Descriptions")
+        query_projects = f"ldapsearch -Z -x -LLL -E pr={LDAP_PAGE_SIZE}/noprompt -H {shlex.quote(cluster.ldap_uri)} {shlex.quote(LDAP_DESCRIPTION_FILTER)} description"
+        queries.append((query_projects, PROJECT_DESCRIPTION_LDIF, None))
+    else:
+        print("Reusing Metis Project Descriptions")
 
-    # Write all disabled pis to disabled_pis.txt
-    metis_projects.write_disabled_pis()
+    # Get all Metis groups, parsing them as they are read
+    print("Getting Metis Project Groups")
+    metis_groups = f"cat {shlex.quote(cluster.groups_source)}"
+    queries.append((metis_groups, PROJECT_GROUPS_FILE, metis_projects.add_project_groups_line))
 
-    # Write all active pis to active_pis.txt
-    metis_projects.write_active_pis()
+    metis_projects.query_and_write_files(queries, timeout=args.query_timeout)
+    metis_projects.project_groups_source = PROJECT_GROUPS_FILE
+    if query_descriptions:
+        metis_projects.write_project_description_file()
 
-    # Retrieving and writing all Metis Projects
-    metis_projects.fetch_active_metis_projects()
-    
-    # Get PIs and their projects
-    metis_projects.pis_and_projects(filename="./metis_project_description.txt")
+    # Only run the stages downstream of the inputs and options that changed since the last run
+    targets = None
+    if args.incremental:
+        state = metis_projects.run_state({"html_shard": args.html_shard, "html_page_size": args.html_page_size, "catalog": args.catalog})
+        targets = metis_projects.outdated_stages(pipeline, metis_projects.load_state(args.state_file), state)
+        
+        if not targets:
+            print("No Metis inputs changed")
+            return
 
-    # Write the active metis projects data
-    metis_projects.write_active_metis_projects(metis_projects.active_metis_projects, "./web_metis_project_data.txt")
-    
-    # Write the PIs and their project descriptions
-    metis_projects.write_pis_and_project_descriptions(metis_projects.pi_and_project_descriptions, "./web_metis_pi_project_descriptions.txt")
-    
-    # Update Metis projects with the most recent project descriptions
-    metis_projects.update_project_descriptions()
+    # Build the output files, running the independent stages at the same time
+    stages = pipeline.run(metis_projects, targets, workers=args.workers)
 
-    # Write the project data as html data
-    metis_projects.write_web_metis_project_data()
+    if args.incremental:
+        metis_projects.save_state(state, args.state_file)
+        print(f"Ran {len(stages)} of {len(pipeline.stages)} stages, updated {len(metis_projects.written_outputs)} Metis output files")
 
 if __name__ == "__main__":
     '''
@@ -0,0 +1,16 @@
+'''
+Shared setup for the get_projects.py tests
+'''
+import os
+import sys
+
+# get_projects.py is a script at the top of the repository, not an installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def pytest_configure(config):
+    '''
+    Register the marker of the tests that take several seconds
+    '''
+    config.addinivalue_line("markers", "slow: runs the pipeline on large synthetic data, deselect with -m 'not slow'")
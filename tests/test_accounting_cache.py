@@ -0,0 +1,99 @@
+'''
+Tests for the on-disk cache of the parsed accounting CSVs
+'''
+import os
+import time
+
+from get_projects import AccountingCache
+
+USERS_CSV = "Alice Smith,asmith@niu.edu,x,Physics\nBob Jones,bjones@niu.edu,x,Physics\n"
+
+def write_export(tmp_path, content=USERS_CSV):
+    '''
+    Write a users export and return its path
+    '''
+    filename = tmp_path / "metis_users.csv"
+    filename.write_text(content)
+    return str(filename)
+
+def test_hit_after_parse(tmp_path):
+    '''
+    The table parsed by one run is loaded from the cache by the next, without parsing
+    '''
+    filename = write_export(tmp_path)
+    table, rows = AccountingCache(str(tmp_path / "cache")).load(filename, "users")
+    assert rows == 2
+    assert table == {"asmith@niu.edu": ("Alice Smith", "Physics"), "bjones@niu.edu": ("Bob Jones", "Physics")}
+
+    assert AccountingCache(str(tmp_path / "cache")).load(filename, "users") == (table, None)
+
+def test_touched_and_changed_exports(tmp_path):
+    '''
+    A touched export with the same content is not parsed again, a changed one is
+    '''
+    filename = write_export(tmp_path)
+    AccountingCache(str(tmp_path / "cache")).load(filename, "users")
+
+    os.utime(filename, (time.time() + 10, time.time() + 10))
+    assert AccountingCache(str(tmp_path / "cache")).load(filename, "users")[1] is None
+
+    write_export(tmp_path, USERS_CSV.replace("Physics", "Chemistry"))
+    table, rows = AccountingCache(str(tmp_path / "cache")).load(filename, "users")
+    assert rows == 2
+    assert table["asmith@niu.edu"] == ("Alice Smith", "Chemistry")
+
+def test_damaged_table_parsed_again(tmp_path):
+    '''
+    A table that cannot be unpickled costs a parse, not the run
+    '''
+    filename = write_export(tmp_path)
+    cache = AccountingCache(str(tmp_path / "cache"))
+    cache.load(filename, "users")
+    with open(cache.entry_filename(os.path.abspath(filename), "users", "pickle"), "wb") as file:
+        file.write(b"not a pickle")
+
+    assert AccountingCache(str(tmp_path / "cache")).load(filename, "users")[1] == 2
+
+def test_evict(tmp_path):
+    '''
+    Entries of a removed export, unused entries and tables without an index are removed
+    '''
+    directory = tmp_path / "cache"
+    kept = write_export(tmp_path)
+    gone = str(tmp_path / "gone.csv")
+    with open(gone, "w") as file:
+        file.write(USERS_CSV)
+
+    cache = AccountingCache(str(directory))
+    cache.load(kept, "users")
+    cache.load(gone, "pis")
+    os.remove(gone)
+
+    orphan = directory / ("lastlog-" + "1" * 32 + ".pickle")
+    orphan.write_bytes(b"")
+    unrelated = directory / "README"
+    unrelated.write_text("")
+
+    AccountingCache(str(directory))
+    assert sorted(os.listdir(directory)) == sorted([
+        "README",
+        os.path.basename(cache.entry_filename(os.path.abspath(kept), "users")),
+        os.path.basename(cache.entry_filename(os.path.abspath(kept), "users", "pickle"))
+    ])
+
+    # Not used for max_age days
+    index = cache.entry_filename(os.path.abspath(kept), "users")
+    os.utime(index, (time.time() - 31 * 86400, time.time() - 31 * 86400))
+    AccountingCache(str(directory), max_age=30)
+    assert os.listdir(directory) == ["README"]
+
+def test_memory_only(tmp_path):
+    '''
+    Without a directory nothing is written, and a table is parsed once per process
+    '''
+    filename = write_export(tmp_path)
+    cache = AccountingCache(directory=None)
+
+    assert cache.load(filename, "users")[1] == 2
+    assert cache.load(filename, "users")[1] is None
+    assert sorted(os.listdir(tmp_path)) == ["metis_users.csv"]
@@ -0,0 +1,65 @@
+'''
+Tests for the --batch JSON config of several clusters
+'''
+import json
+
+import pytest
+
+import get_projects
+from get_projects import load_batch_config
+
+def write_config(tmp_path, clusters):
+    '''
+    Write a --batch config of clusters and return its path
+    '''
+    filename = tmp_path / "clusters.json"
+    filename.write_text(json.dumps({"clusters": clusters}))
+    return str(filename)
+
+def test_paths_relative_to_config(tmp_path):
+    '''
+    A cluster's directory defaults to its name, next to the config file
+    '''
+    clusters = load_batch_config(write_config(tmp_path, [
+        {"name": "metis"},
+        {"name": "newcluster", "public_html_dir": "public/newcluster"}
+    ]))
+
+    assert [cluster.directory for cluster in clusters] == [str(tmp_path / "metis"), str(tmp_path / "newcluster")]
+    assert clusters[0].public_html_dir == get_projects.PUBLIC_HTML_DIR
+    assert clusters[1].public_html_dir == str(tmp_path / "public" / "newcluster")
+
+@pytest.mark.parametrize("clusters", [
+    [{"name": "metis"}, {"name": "metis"}],
+    [{"name": "metis"}, {"name": "newcluster", "directory": "./metis/"}],
+    [{"name": "metis"}, {"name": "newcluster"}],
+    [
+        {"name": "metis", "public_html_dir": "public"},
+        {"name": "newcluster", "public_html_dir": "newcluster/../public"}
+    ]
+])
+def test_clusters_sharing_outputs_refused(tmp_path, clusters):
+    '''
+    Clusters with the same name, or resolving to the same directory or public html directory, are refused
+    '''
+    with pytest.raises(ValueError):
+        load_batch_config(write_config(tmp_path, clusters))
+
+@pytest.mark.parametrize("option", [
+    ["--metrics-json", "metrics.json"],
+    ["--metrics-prom", "metrics.prom"],
+    ["--profile", "profiles"],
+    ["--snapshot", "inputs.zip"],
+    ["--replay", "inputs.zip"]
+])
+def test_single_run_options_refused(tmp_path, option, capsys):
+    '''
+    The options of a single run are refused with --batch, before any cluster runs
+    '''
+    config = write_config(tmp_path, [{"name": "metis", "public_html_dir": "public"}])
+    with pytest.raises(SystemExit) as error:
+        get_projects.main(["--batch", config] + option)
+
+    assert error.value.code == 2
+    assert f"{option[0]} cannot be combined with --batch" in capsys.readouterr().err
+    assert not (tmp_path / "metis").exists()
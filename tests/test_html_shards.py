@@ -0,0 +1,54 @@
+'''
+Tests for splitting the web page into shards
+'''
+from get_projects import MetisProjects, ProjectRecord
+
+def project(title, department)->ProjectRecord:
+    '''
+    Return a project of department
+    '''
+    record = ProjectRecord(title, "pi")
+    record.set_department(department)
+    return record
+
+def test_department_keys_unique():
+    '''
+    Departments with the same slug get distinct keys, a department without letters or digits is "other"
+    '''
+    projects = [
+        project("a", "Physics"),
+        project("b", "physics"),
+        project("c", "Chemistry & Biochemistry"),
+        project("d", "Chemistry, Biochemistry"),
+        project("e", "&"),
+        project("f", "Physics")
+    ]
+    shards = MetisProjects().html_shards(projects, "department", 50)
+
+    assert [(key, label, [group.group_title for group in groups]) for key, label, groups in shards] == [
+        ("other", "&", ["e"]),
+        ("chemistry_biochemistry", "Chemistry & Biochemistry", ["c"]),
+        ("chemistry_biochemistry_2", "Chemistry, Biochemistry", ["d"]),
+        ("physics", "Physics", ["a", "f"]),
+        ("physics_2", "physics", ["b"])
+    ]
+
+def test_department_pages_written(tmp_path, monkeypatch):
+    '''
+    Every department gets its own page, and the index links each label to its page
+    '''
+    monkeypatch.chdir(tmp_path)
+    metis_projects = MetisProjects(public_html_dir=str(tmp_path))
+    projects = [project("a", "Physics"), project("b", "physics")]
+    shards = [
+        (f"web_project_html_{key}.txt", label, groups)
+        for key, label, groups in metis_projects.html_shards(projects, "department", 50)
+    ]
+    for filename, label, groups in shards:
+        metis_projects.write_html_page(filename, groups, len(projects), label)
+    metis_projects.write_html_index("web_project_html_index.txt", shards, len(projects))
+
+    index = (tmp_path / "web_project_html_index.txt").read_text()
+    assert '<a href="web_project_html_physics.txt">Physics</a>' in index
+    assert '<a href="web_project_html_physics_2.txt">physics</a>' in index
+    assert "<h2 class=\"header-text\">physics</h2>" in (tmp_path / "web_project_html_physics_2.txt").read_text()
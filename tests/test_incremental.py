@@ -0,0 +1,81 @@
+'''
+Tests for choosing the stages an incremental run reruns
+'''
+import pytest
+
+import get_projects
+from get_projects import MetisProjects
+
+OPTIONS = {"html_shard": None, "html_page_size": 50, "catalog": None}
+
+@pytest.fixture
+def metis_projects(tmp_path, monkeypatch):
+    '''
+    MetisProjects with its inputs and every output file in a temporary working directory
+    '''
+    monkeypatch.chdir(tmp_path)
+    for filename in get_projects.OUTPUT_FILES:
+        (tmp_path / filename).write_text("")
+    for filename in ("metis_users.csv", "metis_pis.csv", "metis_pi_lastlog.csv",
+                     get_projects.PROJECT_GROUPS_FILE, get_projects.PROJECT_DESCRIPTION_FILE):
+        (tmp_path / filename).write_text(f"{filename}\n")
+    return MetisProjects("metis_users.csv", "metis_pis.csv", "metis_pi_lastlog.csv")
+
+def test_nothing_changed(metis_projects):
+    '''
+    The same inputs, options and code leave nothing to run, whatever was saved survives the state file
+    '''
+    state = metis_projects.run_state(OPTIONS)
+    metis_projects.save_state(state, "state.json")
+    previous_state = metis_projects.load_state("state.json")
+
+    assert metis_projects.outdated_stages(metis_projects.pipeline(), previous_state, state) == []
+
+def test_changed_input(metis_projects, tmp_path):
+    '''
+    A changed last login export reruns the stages downstream of it only
+    '''
+    previous_state = metis_projects.run_state(OPTIONS)
+    (tmp_path / "metis_pi_lastlog.csv").write_text("changed\n")
+
+    pipeline = metis_projects.pipeline()
+    outdated = metis_projects.outdated_stages(pipeline, previous_state, metis_projects.run_state(OPTIONS))
+    assert outdated == [
+        "load_last_logins", "last_login", "projects_txt", "projects_json",
+        "update_descriptions", "validate", "excluded", "html", "search_index"
+    ]
+
+    # The stages they depend on run with them, the writers of unchanged outputs do not
+    assert {"load_groups", "pi_details"} <= set(pipeline.select(outdated))
+    assert not {"memberships", "archived_json", "pi_descriptions_files"} & set(pipeline.select(outdated))
+
+def test_changed_options(metis_projects):
+    '''
+    A changed page size reruns the html, a new catalog the catalog
+    '''
+    previous_state = metis_projects.run_state(OPTIONS)
+    state = metis_projects.run_state(dict(OPTIONS, html_page_size=20, catalog="catalog.sqlite"))
+
+    pipeline = metis_projects.pipeline(page_size=20, catalog="catalog.sqlite")
+    assert metis_projects.outdated_stages(pipeline, previous_state, state) == ["html", "catalog"]
+
+@pytest.mark.parametrize("previous_state", [
+    {},
+    {"fingerprints": {}, "options": OPTIONS, "code": "older", "schema_version": get_projects.JSON_SCHEMA_VERSION}
+])
+def test_everything_outdated(metis_projects, previous_state):
+    '''
+    Without a state file, or after the script changed, every stage runs
+    '''
+    pipeline = metis_projects.pipeline()
+    assert metis_projects.outdated_stages(pipeline, previous_state, metis_projects.run_state(OPTIONS)) == list(pipeline.stages)
+
+def test_missing_output(metis_projects, tmp_path):
+    '''
+    A removed output file reruns every stage
+    '''
+    state = metis_projects.run_state(OPTIONS)
+    (tmp_path / "web_project_search.json").unlink()
+
+    pipeline = metis_projects.pipeline()
+    assert metis_projects.outdated_stages(pipeline, state, state) == list(pipeline.stages)
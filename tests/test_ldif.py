@@ -0,0 +1,68 @@
+'''
+Tests for the streaming LDIF reader of the LDAP project descriptions
+'''
+import os
+
+from conftest import FIXTURES
+from get_projects import LDIFReader, MetisProjects, iter_ldif_records
+
+LDIF_FIXTURE = os.path.join(FIXTURES, "descriptions.ldif")
+
+def read_fixture()->list:
+    '''
+    Return the lines of the LDIF fixture
+    '''
+    with open(LDIF_FIXTURE, "r") as file:
+        return file.readlines()
+
+def test_iter_ldap_descriptions():
+    '''
+    Folded lines are unfolded, base64 values decoded and joined onto one line,
+    comments skipped, and the last entry read without a blank line after it
+    '''
+    assert list(MetisProjects.iter_ldap_descriptions(read_fixture())) == [
+        "The ATLAS group searches for new particles beyond the Standard Model, focusing on final states with multiple heavy quarks.",
+        "Études of the quark–gluon plasma",
+        "First description",
+        "Second description, indented",
+        "The last entry has no blank line after it"
+    ]
+
+def test_iter_ldif_records():
+    '''
+    Every entry is returned with all of its attributes, comment blocks are not entries
+    '''
+    records = list(iter_ldif_records(read_fixture()))
+
+    assert [record["dn"] for record in records] == [
+        ["cn=atlas,ou=groups,dc=metis,dc=cls"],
+        ["cn=qgp,ou=groups,dc=metis,dc=cls"],
+        ["cn=twodesc,ou=groups,dc=metis,dc=cls"],
+        ["cn=nodesc,ou=groups,dc=metis,dc=cls"],
+        ["cn=last,ou=groups,dc=metis,dc=cls"]
+    ]
+    assert records[1]["description"] == ["Études of the\nquark–gluon plasma"]
+    assert records[3] == {"dn": ["cn=nodesc,ou=groups,dc=metis,dc=cls"], "cn": ["nodesc"]}
+
+def test_reader_fed_line_by_line():
+    '''
+    An entry is returned by the blank line that ends it, with CRLF line endings
+    '''
+    reader = LDIFReader()
+    assert reader.feed("dn: cn=a\r\n") == []
+    assert reader.feed("description: one\r\n") == []
+    assert reader.feed("  two\r\n") == []
+    assert reader.feed("\r\n") == [{"dn": ["cn=a"], "description": ["one two"]}]
+    assert reader.close() == []
+
+def test_write_project_description_file(tmp_path):
+    '''
+    The description file has one "description: value" line per description
+    '''
+    filename = tmp_path / "metis_project_description.txt"
+    MetisProjects().write_project_description_file(str(filename), LDIF_FIXTURE)
+
+    lines = filename.read_text().splitlines()
+    assert len(lines) == 5
+    assert lines[1] == "description: Études of the quark–gluon plasma"
+    assert all(line.startswith("description: ") for line in lines)
@@ -0,0 +1,67 @@
+'''
+Peak resident memory of a whole run on synthetic data, in a process started for each run
+'''
+import pytest
+
+import benchmark
+import get_projects
+
+# The small benchmark scale, 1k groups and 10k users
+RSS_GROUPS = 1000
+RSS_USERS = 10000
+
+# MiB of lines added to the LDIF dump and to the groups file, which the run reads and copies but does not index
+PADDING_MB = 64
+
+# A streaming run peaks within a few MiB of the unpadded run, buffering the description file
+# or the groups file whole costs about 90-110 MiB more
+RSS_GROWTH_BUDGET_MB = PADDING_MB // 2
+
+def pad_dumps(paths, megabytes)->None:
+    '''
+    Append megabytes of entries without a project to the LDIF dump, folded as ldapsearch does,
+    and megabytes of comment lines to the groups file
+    '''
+    text = "padding " * 20
+    with open(paths["ldif"], "a") as file:
+        number = 0
+        while file.tell() < megabytes << 20:
+            line = f"description: {number} {text}"
+            file.write(f"dn: cn=padding{number},ou=people,dc=hpc,dc=cls\n{line[:76]}\n {line[76:]}\n\n")
+            number += 1
+
+    with open(paths["groups"], "a") as file:
+        while file.tell() < megabytes << 20:
+            file.write(f"# {text}\n")
+
+def run_max_rss_mb(directory, paths)->float:
+    '''
+    Return the peak RSS in MiB of a run on paths, in a fresh process
+    '''
+    (directory / "run").mkdir()
+    max_rss_kb = benchmark.pipeline_max_rss_kb(paths, str(directory / "run"))
+    if max_rss_kb is None:
+        pytest.skip("The peak RSS is not available on this platform")
+    return max_rss_kb / 1024
+
+@pytest.mark.slow
+def test_peak_rss_independent_of_dump_size(tmp_path, monkeypatch):
+    '''
+    The same projects with 64 MiB larger dumps peak at about the same RSS, as the input and output files are streamed
+    '''
+    (tmp_path / "public").mkdir()
+    monkeypatch.setattr(get_projects, "PUBLIC_HTML_DIR", str(tmp_path / "public"))
+
+    runs = {}
+    for name in ("plain", "padded"):
+        directory = tmp_path / name
+        directory.mkdir()
+        paths = benchmark.generate_data(str(directory), RSS_GROUPS, RSS_USERS)
+        if name == "padded":
+            pad_dumps(paths, PADDING_MB)
+        runs[name] = run_max_rss_mb(directory, paths)
+
+    assert runs["padded"] - runs["plain"] <= RSS_GROWTH_BUDGET_MB
+
+    # The padding went through the run, into the description file without its dn lines
+    assert (tmp_path / "padded" / "run" / "metis_project_description.txt").stat().st_size > (PADDING_MB // 2) << 20
@@ -0,0 +1,101 @@
+'''
+Tests for running the MetisProjects stages as a dependency graph
+'''
+import threading
+
+import pytest
+
+from get_projects import MetisProjects, Pipeline, PipelineStage, StageMetrics
+
+def recording_pipeline(runs)->Pipeline:
+    '''
+    Return a pipeline a -> (b, c) -> d whose stages append (name, thread) to runs
+    '''
+    def stage(name, inputs, outputs):
+        return PipelineStage(name, inputs, outputs, lambda metis_projects: runs.append((name, threading.current_thread())))
+
+    return Pipeline([
+        stage("d", ["b_out", "c_out"], ["d_out"]),
+        stage("a", ["input.txt"], ["a_out"]),
+        stage("b", ["a_out"], ["b_out"]),
+        stage("c", ["a_out"], ["c_out"])
+    ])
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_dependency_order(workers):
+    '''
+    A stage runs after every stage writing one of its inputs
+    '''
+    runs = []
+    assert recording_pipeline(runs).run(MetisProjects(), workers=workers) == ["d", "a", "b", "c"]
+
+    order = [name for name, _ in runs]
+    assert order[0] == "a"
+    assert set(order[1:3]) == {"b", "c"}
+    assert order[3] == "d"
+
+def test_one_worker_runs_on_this_thread():
+    '''
+    With one worker the stages run one by one, in declaration order among the ready stages, on the calling thread
+    '''
+    runs = []
+    recording_pipeline(runs).run(MetisProjects(), workers=1)
+    assert runs == [(name, threading.current_thread()) for name in ("a", "b", "c", "d")]
+
+def test_profiled_stages_run_on_main_thread():
+    '''
+    Every stage gets a profile, whatever the number of workers
+    '''
+    runs = []
+    metis_projects = MetisProjects()
+    metis_projects.metrics = StageMetrics(profile=True)
+    recording_pipeline(runs).run(metis_projects, workers=4)
+
+    assert {thread for _, thread in runs} == {threading.main_thread()}
+    assert set(metis_projects.metrics.profilers) == {"a", "b", "c", "d"}
+
+def test_targets():
+    '''
+    A target runs with the stages it depends on only, unknown targets are refused
+    '''
+    runs = []
+    pipeline = recording_pipeline(runs)
+    assert pipeline.run(MetisProjects(), ["b"]) == ["a", "b"]
+
+    with pytest.raises(ValueError):
+        pipeline.select(["nothing"])
+
+def test_failed_stage():
+    '''
+    The exception of a failed stage is raised, and the stages depending on it do not run
+    '''
+    def fail(metis_projects):
+        raise KeyError("a")
+
+    runs = []
+    pipeline = recording_pipeline(runs)
+    pipeline.stages["a"] = pipeline.stages["a"]._replace(run=fail)
+
+    with pytest.raises(KeyError):
+        pipeline.run(MetisProjects(), workers=4)
+    assert runs == []
+
+@pytest.mark.parametrize("stages", [
+    [PipelineStage("a", ["b_out"], ["a_out"], None), PipelineStage("b", ["a_out"], ["b_out"], None)],
+    [PipelineStage("a", ["a_out"], ["a_out"], None)]
+])
+def test_cycle_refused(stages):
+    '''
+    Stages depending on each other, or on their own output, can never run
+    '''
+    with pytest.raises(ValueError, match="cycle"):
+        Pipeline(stages)
+
+def test_downstream():
+    '''
+    The stages reading a resource, and the stages reading their outputs, are downstream of it
+    '''
+    pipeline = recording_pipeline([])
+    assert pipeline.downstream(["input.txt"]) == ["d", "a", "b", "c"]
+    assert pipeline.downstream(["b_out"]) == ["d"]
+    assert pipeline.downstream(["other.txt"]) == []
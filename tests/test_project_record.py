@@ -0,0 +1,37 @@
+'''
+Tests for the slotted ProjectRecord
+'''
+import pytest
+
+from get_projects import ProjectRecord
+
+@pytest.mark.parametrize("value", ["a,b,c", "a, b, c", "a, b,c", "a,  b", "a ,b", "a"])
+def test_group_members_as_written(value):
+    '''
+    The members are written out exactly as they appear in the groups file
+    '''
+    project = ProjectRecord("group", "pi")
+    project.set_members(value)
+
+    assert project.group_members == value
+    assert project.as_dict()["group_members"] == value
+
+def test_regular_members_value_not_stored():
+    '''
+    Only irregularly spaced values are kept besides the interned usernames
+    '''
+    project = ProjectRecord("group", "pi")
+    project.set_members("a, b, c")
+
+    assert project.members == ("a", "b", "c")
+    assert project.members_value is None
+    assert project.group_member_count == 3
+
+def test_no_members():
+    '''
+    A group without a -members entry has no members and no member count
+    '''
+    project = ProjectRecord("group", "pi")
+
+    assert project.group_members is None
+    assert project.group_member_count is None
@@ -0,0 +1,195 @@
+'''
+Tests for the --serve JSON API, on a loopback port with fixture files
+'''
+import json
+import os
+import shutil
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+
+from conftest import FIXTURES
+from get_projects import ProjectServer
+
+SERVE_FIXTURES = os.path.join(FIXTURES, "serve")
+
+@pytest.fixture
+def inputs(tmp_path):
+    '''
+    Copy the serve fixtures to a temporary directory, so a test can change them
+    '''
+    for filename in os.listdir(SERVE_FIXTURES):
+        shutil.copy(os.path.join(SERVE_FIXTURES, filename), tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def server(inputs):
+    '''
+    Serve the copied fixtures on a free loopback port, polling them every 50 ms
+    '''
+    server = ProjectServer(
+        str(inputs / "metis_users.csv"), str(inputs / "metis_pis.csv"), str(inputs / "metis_pi_lastlog.csv"),
+        description_file=str(inputs / "metis_project_description.txt"),
+        groups_file=str(inputs / "metis_project_groups.txt"),
+        poll_interval=0.05
+    )
+    host, port = server.start("127.0.0.1", 0)
+    server.url = f"http://{host}:{port}"
+    yield server
+    server.stop()
+
+def get(server, path):
+    '''
+    Return the decoded JSON response of a GET request for path
+    '''
+    with urllib.request.urlopen(server.url + path, timeout=5) as response:
+        assert response.headers["Content-Type"] == "application/json"
+        return json.loads(response.read())
+
+def wait_for(condition, timeout=5):
+    '''
+    Wait until condition() is true, failing after timeout seconds
+    '''
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+def test_projects(server):
+    '''
+    Every active project is listed, ?visible=1 only lists the projects on the web page
+    '''
+    assert [project["group_title"] for project in get(server, "/projects")] == ["oldgrp", "atlas", "qgp"]
+    assert [project["group_title"] for project in get(server, "/projects?visible=1")] == ["atlas", "qgp"]
+
+    qgp = get(server, "/projects/qgp")
+    assert qgp["PI_name"] == "Bob Jones"
+    assert qgp["PI_department"] == "Physics"
+    assert qgp["description"] == "Quark gluon plasma studies"
+    assert qgp["group_members"] == "bjones,u2"
+    assert qgp["pi_last_login"] == "2026-09-15"
+
+def test_lookups(server):
+    '''
+    Projects are found by PI, department and member
+    '''
+    assert [project["group_title"] for project in get(server, "/pis/asmith")] == ["atlas"]
+    assert [project["group_title"] for project in get(server, "/departments/Physics")] == ["atlas", "qgp"]
+    assert [project["group_title"] for project in get(server, "/members/u2")] == ["atlas", "qgp"]
+    assert get(server, "/members/nobody") == []
+
+def test_counts(server):
+    '''
+    /counts has the number of projects, PIs, members and projects per department
+    '''
+    counts = get(server, "/counts")
+    assert counts["projects"] == 3
+    assert counts["visible_projects"] == 2
+    assert counts["pis"] == 3
+    assert counts["members"] == 5
+    assert counts["departments"] == {"Physics": 2}
+
+def search(server, **query):
+    '''
+    Return the group titles and the department facets of a /search request
+    '''
+    response = get(server, "/search?" + urllib.parse.urlencode(query))
+    return [project["group_title"] for project in response["projects"]], response["facets"]["department"]
+
+@pytest.fixture
+def climate_server(server, inputs):
+    '''
+    The server once a Geography project was added to the web page, so the search spans two departments
+    '''
+    built = server.snapshot
+    with open(inputs / "metis_project_groups.txt", "a") as file:
+        file.write("climate-pi: cwu\nclimate-members: cwu, u1\n")
+    wait_for(lambda: server.snapshot is not built)
+    return server
+
+def test_search_prefix(server):
+    '''
+    A word matches the projects with a title, PI name, department or description word starting with it,
+    in any case, words shorter than two letters are ignored
+    '''
+    assert search(server, q="plas")[0] == ["qgp"]
+    assert search(server, q="SMI")[0] == ["atlas"]
+    assert search(server, q="phys")[0] == ["atlas", "qgp"]
+    assert search(server, q="x")[0] == ["atlas", "qgp"]
+    assert search(server, q="plasmas")[0] == []
+
+def test_search_two_words(server):
+    '''
+    Every word of the query has to match the same project
+    '''
+    assert search(server, q="physics gluon")[0] == ["qgp"]
+    assert search(server, q="physics quark")[0] == ["atlas", "qgp"]
+    assert search(server, q="bo gl")[0] == ["qgp"]
+    assert search(server, q="alice plasma") == ([], {})
+
+def test_search_department(climate_server):
+    '''
+    department= only keeps the projects of that department, spelled exactly
+    '''
+    assert search(climate_server, q="", department="Physics")[0] == ["atlas", "qgp"]
+    assert search(climate_server, q="c", department="Geography")[0] == ["climate"]
+    assert search(climate_server, q="climate", department="Physics")[0] == []
+    assert search(climate_server, department="physics")[0] == []
+
+def test_search_facets(climate_server):
+    '''
+    The facets count the matching projects per department
+    '''
+    assert search(climate_server) == (["atlas", "qgp", "climate"], {"Geography": 1, "Physics": 2})
+    assert search(climate_server, q="studies") == (["qgp"], {"Physics": 1})
+    assert search(climate_server, q="ch")[1] == {"Geography": 1}
+    assert search(climate_server, q="", department="Physics")[1] == {"Physics": 2}
+
+def test_not_found(server):
+    '''
+    Unknown paths and projects answer 404
+    '''
+    for path in ("/nothing", "/projects/nothing"):
+        with pytest.raises(urllib.error.HTTPError) as error:
+            get(server, path)
+        assert error.value.code == 404
+
+def test_rebuild_after_input_changes(server, inputs):
+    '''
+    A project added to the groups file is served once the poll rebuilt the snapshot
+    '''
+    built = server.snapshot
+    with open(inputs / "metis_project_groups.txt", "a") as file:
+        file.write("climate-pi: cwu\nclimate-members: cwu, u1\n")
+
+    wait_for(lambda: server.snapshot is not built)
+    assert get(server, "/projects/climate")["PI_department"] == "Geography"
+    assert [project["group_title"] for project in get(server, "/members/u1")] == ["atlas", "climate"]
+
+    # The descriptions did not change, their parsed state is reused
+    assert server.snapshot.metis_projects.description_by_pi is built.metis_projects.description_by_pi
+
+def test_poll_survives_failed_rebuild(server, inputs, monkeypatch):
+    '''
+    A rebuild failing with any error keeps the last snapshot and polling goes on
+    '''
+    built = server.snapshot
+    build = server.build
+    failures = []
+
+    def failing_build(signatures):
+        if not failures:
+            failures.append(signatures)
+            raise KeyError("half written export")
+        return build(signatures)
+
+    monkeypatch.setattr(server, "build", failing_build)
+    with open(inputs / "metis_project_groups.txt", "a") as file:
+        file.write("climate-pi: cwu\nclimate-members: cwu\n")
+
+    wait_for(lambda: server.snapshot is not built)
+    assert failures
+    assert get(server, "/projects/climate")["group_title"] == "climate"